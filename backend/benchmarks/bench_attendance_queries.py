@@ -0,0 +1,95 @@
+"""Seed a Postgres database with years of attendance and show the query plans.
+
+Prints EXPLAIN ANALYZE for the attendance filters used by the routes, both
+the old func.date()/extract() predicates and the stored-day range
+predicates. Point it at a scratch database, the tables are dropped and
+recreated. Run from the backend directory:
+    python -m benchmarks.bench_attendance_queries postgresql+asyncpg://user:pw@localhost/bench --students 3000 --years 3
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+
+from sqlalchemy import func, extract, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from db import Base, upgrade_schema
+from models.model import Student, Attendance
+from utils.attendance_utils import period_bounds
+
+SLOTS = ("7:50 AM - 9:30 AM", "9:50 AM - 11:30 AM", "12:10 PM - 1:40 PM")
+
+
+async def seed(conn, students, years, presence):
+    await conn.run_sync(Base.metadata.drop_all)
+    await conn.run_sync(Base.metadata.create_all)
+    await upgrade_schema(conn)
+
+    await conn.execute(text(
+        "INSERT INTO students (enrollment_number, name) "
+        "SELECT 'E' || s, 'Student ' || s FROM generate_series(1, :students) AS s"
+    ), {"students": students})
+
+    start = time.perf_counter()
+    await conn.execute(text(
+        "INSERT INTO attendance (student_id, date, day, time_slot, status) "
+        "SELECT s.id, d + interval '8 hours', d::date, slot, 'Present' "
+        "FROM generate_series(current_date - make_interval(years => :years), current_date::timestamp, interval '1 day') AS d "
+        "CROSS JOIN unnest(CAST(:slots AS text[])) AS slot "
+        "CROSS JOIN students s "
+        "WHERE extract(isodow FROM d) < 6 AND random() < :presence"
+    ), {"years": years, "slots": list(SLOTS), "presence": presence})
+    await conn.execute(text("ANALYZE attendance"))
+    await conn.execute(text("ANALYZE students"))
+
+    rows = (await conn.execute(text("SELECT count(*) FROM attendance"))).scalar()
+    print(f"Seeded {rows} attendance rows in {time.perf_counter() - start:.1f}s")
+
+
+def queries(target_date):
+    base = select(Attendance, Student).join(Student)
+    slot = SLOTS[0]
+    day_start, day_end = period_bounds("day", target_date)
+    month_start, month_end = period_bounds("month", target_date)
+
+    yield "today count (old)", select(func.count(Attendance.id)).where(func.date(Attendance.date) == target_date)
+    yield "today count", select(func.count(Attendance.id)).where(Attendance.day == target_date)
+    yield "day + slot (old)", base.where(Attendance.time_slot == slot, func.date(Attendance.date) == target_date)
+    yield "day + slot", base.where(Attendance.time_slot == slot, Attendance.day >= day_start, Attendance.day < day_end)
+    yield "month (old)", base.where(
+        extract("year", Attendance.date) == target_date.year,
+        extract("month", Attendance.date) == target_date.month,
+    )
+    yield "month", base.where(Attendance.day >= month_start, Attendance.day < month_end)
+    yield "already marked", select(Attendance.student_id, Attendance.time_slot).where(Attendance.day == target_date)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database_url")
+    parser.add_argument("--students", type=int, default=3000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--presence", type=float, default=0.8)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as conn:
+        if not args.skip_seed:
+            await seed(conn, args.students, args.years, args.presence)
+
+        target_date = date.today()
+        for name, stmt in queries(target_date):
+            sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+            plan = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"))
+            print(f"\n== {name}")
+            for (line,) in plan:
+                print(line)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Per-frame latency of the old two-pass MTCNN path vs predict_image.
+
+"two-pass" is what predict_image used to do: detect() for the boxes, then
+mtcnn() for the aligned crop, which runs the cascade a second time, then the
+embedding and the gallery search. "predict_image" is the production path
+(predict_batch for one frame): one detection pass, crops cut from its boxes.
+Both start from the resized frame and need an enrolled gallery.
+Run from the backend directory:
+    python -m benchmarks.bench_detect_align path/to/frame.jpg --runs 50
+"""
+import argparse
+import statistics
+import time
+
+from PIL import Image
+
+from controllers import students_pred
+from controllers.students_pred import predict_image
+from utils.frame_preprocess import fit_width, prepare_frame
+from utils.inference_backends import get_embedder
+from utils.model_registry import device, get_mtcnn, inference_context
+
+
+def two_pass(image):
+    image, _, _ = prepare_frame(image)
+    mtcnn = get_mtcnn()
+    with inference_context():
+        boxes, probs = mtcnn.detect(image)
+        if boxes is None:
+            return None
+        face = mtcnn(image)
+    embedding = get_embedder()(face.unsqueeze(0).to(device))
+    return students_pred.gallery.search(embedding, k=1)
+
+
+def single_pass(image):
+    return predict_image(image)
+
+
+def time_fn(fn, image, runs, warmup):
+    for _ in range(warmup):
+        fn(image)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(image)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<14} mean {statistics.mean(timings):7.2f} ms | "
+        f"p50 {statistics.median(timings):7.2f} ms | p95 {p95:7.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    img = Image.open(args.image).convert("RGB")
+    # Same resize predict_image applies before detection
+    img = fit_width(img)
+
+    if students_pred.gallery is None:
+        raise SystemExit("The embedding store is empty; predict_image stops before detection, enroll a student first")
+    result = predict_image(img)
+    print(f"predict_image: {result[:3]}")
+
+    before = time_fn(two_pass, img, args.runs, args.warmup)
+    after = time_fn(single_pass, img, args.runs, args.warmup)
+
+    report("two-pass", before)
+    report("predict_image", after)
+    print(f"speedup        {statistics.mean(before) / statistics.mean(after):.2f}x")
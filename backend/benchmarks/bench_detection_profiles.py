@@ -0,0 +1,107 @@
+"""Detection latency and recall of every detection profile.
+
+Pastes each face image into a background frame at several face sizes and
+runs the detector of every profile over the frames, once on the profile's
+own region and once on a region tracked around the face (what RegionTracker
+hands out on the frames after a detection). Recall is relative to the
+default profile on the full frame: the share of its boxes that the profile
+finds again at IoU >= 0.5. Run from the backend directory:
+    python -m benchmarks.bench_detection_profiles path/to/face.jpg --background path/to/empty_room.jpg
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from controllers.students_pred import detect_regions
+from utils.detection_profiles import PROFILES, RegionTracker
+from utils.face_tracker import box_iou
+from utils.frame_preprocess import prepare_frame
+from utils.model_registry import warmup
+
+
+def frames(faces, background, scales, seed=0):
+    # One frame per face image and size, the face at a random position
+    rng = np.random.default_rng(seed)
+    for face in faces:
+        for scale in scales:
+            frame = background.copy()
+            side = max(24, int(frame.size[1] * scale))
+            x = int(rng.integers(0, frame.size[0] - side + 1))
+            y = int(rng.integers(0, frame.size[1] - side + 1))
+            frame.paste(face.resize((side, side), Image.Resampling.BILINEAR), (x, y))
+            yield scale, prepare_frame(frame)[1]
+
+
+def detect(pixels, profile, roi, repeats):
+    detect_regions([(pixels, profile, roi)])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        boxes, _ = detect_regions([(pixels, profile, roi)])[0]
+    return boxes, (time.perf_counter() - start) / repeats
+
+
+def found(reference, boxes):
+    if reference is None or not len(reference):
+        return 0, 0
+    if boxes is None or not len(boxes):
+        return 0, len(reference)
+    return int((box_iou(reference, boxes).max(axis=1) >= 0.5).sum()), len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("faces", nargs="+", help="face images to paste into the frames")
+    parser.add_argument("--background", help="frame without people, gray if omitted")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.6, 0.35, 0.2, 0.12],
+                        help="pasted face image height as a share of the frame height")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.background:
+        background = Image.open(args.background).convert("RGB").resize((640, 480))
+    else:
+        background = Image.new("RGB", (640, 480), (128, 128, 128))
+    faces = [Image.open(path).convert("RGB") for path in args.faces]
+    samples = list(frames(faces, background, args.scales))
+    warmup()
+
+    reference = {}
+    for k, (_, pixels) in enumerate(samples):
+        reference[k], _ = detect(pixels, PROFILES["default"], None, 1)
+
+    print(f"{len(samples)} frames, {sum(len(r) for r in reference.values() if r is not None)} reference faces")
+    print(f"{'profile':>10} {'region':>8} {'ms/frame':>9} {'recall':>7}  recall by scale")
+    for name in args.profiles:
+        profile = PROFILES[name]
+        for tracked in (False, True):
+            seconds, hits, total = 0.0, 0, 0
+            by_scale = {}
+            for k, (scale, pixels) in enumerate(samples):
+                roi = None
+                if tracked:
+                    if reference[k] is None:
+                        continue
+                    region = RegionTracker(profile)
+                    region.update(reference[k].tolist(), (pixels.shape[1], pixels.shape[0]))
+                    roi = region.next_roi()
+                boxes, frame_seconds = detect(pixels, profile, roi, args.repeats)
+                hit, count = found(reference[k], boxes)
+                seconds += frame_seconds
+                hits, total = hits + hit, total + count
+                scale_hits, scale_total = by_scale.get(scale, (0, 0))
+                by_scale[scale] = (scale_hits + hit, scale_total + count)
+
+            measured = len(samples) if not tracked else sum(r is not None for r in reference.values())
+            recall = hits / total if total else 0
+            per_scale = " ".join(f"{s:g}:{h}/{t}" for s, (h, t) in sorted(by_scale.items(), reverse=True))
+            print(
+                f"{name:>10} {'tracked' if tracked else 'profile':>8} "
+                f"{seconds * 1000 / max(measured, 1):>9.1f} {recall:>7.3f}  {per_scale}"
+            )
+
+
+if __name__ == "__main__":
+    main()
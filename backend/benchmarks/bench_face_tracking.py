@@ -0,0 +1,63 @@
+"""Embedding calls and time for a simulated camera stream, with and without tracking.
+
+The stream is the given image with a small random shift per frame, i.e. a
+student standing in front of the camera. Run from the backend directory:
+    python -m benchmarks.bench_face_tracking path/to/face.jpg --frames 60
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from PIL import Image
+
+from utils import inference_service
+from utils.face_tracker import FaceTracker
+from utils.model_registry import warmup
+
+
+def make_stream(image, frames, jitter, seed=0):
+    rng = random.Random(seed)
+    width, height = image.size
+    stream = []
+    for _ in range(frames):
+        dx, dy = rng.randint(0, jitter), rng.randint(0, jitter)
+        stream.append(image.crop((dx, dy, width - jitter + dx, height - jitter + dy)))
+    return stream
+
+
+async def run(stream, tracker):
+    start = time.perf_counter()
+    results = []
+    for frame in stream:
+        if tracker is None:
+            results.append(await inference_service.predict(frame))
+        else:
+            results.append(await inference_service.predict_tracked(tracker, frame))
+    return results, time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--jitter", type=int, default=8)
+    args = parser.parse_args()
+
+    stream = make_stream(Image.open(args.image).convert("RGB"), args.frames, args.jitter)
+    warmup()
+
+    untracked, untracked_seconds = await run(stream, None)
+    tracker = FaceTracker()
+    tracked, tracked_seconds = await run(stream, tracker)
+
+    faces = sum(1 for result in untracked if result[3] is not None)
+    agree = sum(1 for a, b in zip(untracked, tracked) if a[0] == b[0])
+    print(f"frames: {len(stream)}, faces: {faces}")
+    print(f"untracked: {faces} embeddings, {untracked_seconds / len(stream) * 1000:.1f} ms/frame")
+    print(f"tracked:   {tracker.recognitions} embeddings, {tracked_seconds / len(stream) * 1000:.1f} ms/frame")
+    print(f"same identity on {agree}/{len(stream)} frames")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
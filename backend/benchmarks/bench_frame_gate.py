@@ -0,0 +1,74 @@
+"""CPU time per frame for a mostly idle camera, with and without FrameGate.
+
+Replays a synthetic corridor stream: a background photo without people plus
+sensor noise, and the face image walking past for a few frames in the middle.
+Every frame is treated as one the scheduler handed out for inference.
+Run from the backend directory:
+    python -m benchmarks.bench_frame_gate path/to/face.jpg path/to/empty_corridor.jpg --presence
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from controllers.students_pred import predict_image
+from utils.frame_gate import FrameGate, face_present, NO_FACE
+from utils.model_registry import warmup
+
+
+def corridor(face, background, frames, visible, seed=0):
+    rng = np.random.default_rng(seed)
+    background = np.asarray(background.convert("RGB").resize((640, 480)))
+    face = np.asarray(face.convert("RGB").resize((200, 200)))
+    start = (frames - visible) // 2
+    for i in range(frames):
+        frame = background.copy()
+        if start <= i < start + visible:
+            x = 80 + (i - start) * 40
+            frame[100:300, x:x + 200] = face
+        noise = rng.integers(-2, 3, frame.shape, dtype=np.int16)
+        yield Image.fromarray(np.clip(frame + noise, 0, 255).astype(np.uint8))
+
+
+def run(frames, gate):
+    start = time.perf_counter()
+    detections = 0
+    for image in frames:
+        if gate is not None:
+            if gate.check(image) is not None:
+                continue
+            if gate.presence_check and not face_present(image):
+                gate.empty_frame()
+                gate.processed(NO_FACE)
+                continue
+        result = predict_image(image)
+        detections += 1
+        if gate is not None:
+            gate.processed(result)
+    return (time.perf_counter() - start) * 1000 / len(frames), detections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("face")
+    parser.add_argument("background")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--visible", type=int, default=8)
+    parser.add_argument("--presence", action="store_true", help="also run the P-Net presence check")
+    args = parser.parse_args()
+
+    frames = list(corridor(Image.open(args.face), Image.open(args.background), args.frames, args.visible))
+    warmup()
+
+    gates = [("no gate", None), ("diff gate", FrameGate(presence_check=False))]
+    if args.presence:
+        gates.append(("diff + presence", FrameGate(presence_check=True)))
+    for name, gate in gates:
+        ms_per_frame, detections = run(frames, gate)
+        stats = gate.stats() if gate is not None else {}
+        print(f"{name:>16}: {ms_per_frame:7.2f} ms/frame, full detection on {detections}/{len(frames)} frames {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-frame cost of the preprocessing in front of MTCNN, old path vs frame_preprocess.
+
+"old" decodes the full JPEG, LANCZOS-resizes to 640, builds a grayscale float
+tensor and a fresh Laplacian kernel for the blur score, then lets MTCNN copy
+the PIL image three times into its input tensor. "new" is decode_frame +
+prepare_frame, whose tensor MTCNN uses as is. Run from the backend directory:
+    python -m benchmarks.bench_frame_preprocess path/to/frame.jpg --width 1280 --runs 100
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from utils.frame_preprocess import BLUR_SAMPLE_STEP, BLUR_THRESHOLD, decode_frame, prepare_frame
+
+
+def old_preprocess(data):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    if image.size[0] > 640:
+        ratio = 640 / image.size[0]
+        image = image.resize((640, int(image.size[1] * ratio)), Image.Resampling.LANCZOS)
+
+    gray = torch.from_numpy(np.array(image.convert("L"))).float().unsqueeze(0).unsqueeze(0)
+    kernel = torch.tensor([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype=torch.float32).unsqueeze(0).unsqueeze(0)
+    score = F.conv2d(gray, kernel).var().item()
+
+    # What mtcnn.detect does with a PIL image before the first network
+    pixels = torch.as_tensor(np.stack([np.uint8(image)]).copy())
+    return pixels, score
+
+
+def new_preprocess(data):
+    _, pixels, score = prepare_frame(decode_frame(data))
+    return pixels.unsqueeze(0), score
+
+
+def measure(fn, data, runs):
+    fn(data)
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(data)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--width", type=int, default=1280, help="re-encode the frame at this camera width")
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+
+    image = Image.open(args.image).convert("RGB")
+    image = image.resize((args.width, int(image.size[1] * args.width / image.size[0])), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=args.quality)
+    data = buffer.getvalue()
+    print(f"{image.size[0]}x{image.size[1]} JPEG, {len(data) / 1024:.0f} KB")
+
+    old_pixels, old_score = old_preprocess(data)
+    new_pixels, new_score = new_preprocess(data)
+    print(f"detector input: old {tuple(old_pixels.shape)}, new {tuple(new_pixels.shape)}")
+    # The scores are on different scales when BLUR_SAMPLE_STEP > 1
+    print(
+        f"blur score: old {old_score:.1f} (threshold 50), "
+        f"new {new_score:.1f} (threshold {BLUR_THRESHOLD:g}, luma step {BLUR_SAMPLE_STEP})"
+    )
+
+    for name, fn in (("old", old_preprocess), ("new", new_preprocess)):
+        print(f"{name:>4} {measure(fn, data, args.runs):7.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Query latency of the gallery index at 1k / 10k / 100k identities.
+
+Compares the old per-probe brute force ((gallery - emb).norm + torch.min)
+with GalleryIndex flat search (fp32, fp16 and int8) and IVF search. IVF and
+int8 recall are measured against the exact fp32 top-1. Run from the backend directory:
+    python -m benchmarks.bench_gallery_index --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from utils.gallery_index import GalleryIndex
+
+
+def brute_force(gallery, probes):
+    for emb in probes:
+        dist_list = (gallery - emb).norm(dim=1)
+        torch.min(dist_list, dim=0)
+
+
+def time_ms(fn, runs):
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--probes", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--n-probe", type=int, default=8)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+
+    for size in args.sizes:
+        embeddings = F.normalize(torch.randn(size, 512), dim=1)
+        names = [str(i) for i in range(size)]
+        # Probes are noisy copies of enrolled faces, like real re-sightings
+        picks = torch.randint(0, size, (args.probes,))
+        probes = F.normalize(embeddings[picks] + 0.05 * torch.randn(args.probes, 512), dim=1)
+
+        flat = GalleryIndex(embeddings, names)
+        flat16 = GalleryIndex(embeddings, names, dtype=torch.float16)
+        flat8 = GalleryIndex(embeddings, names, dtype=torch.int8)
+        n_lists = max(1, int(size ** 0.5))
+        ivf = GalleryIndex(embeddings, names, n_lists=n_lists, n_probe=args.n_probe)
+
+        exact = flat.search(probes, k=1)[1][:, 0]
+        recall = (ivf.search(probes, k=1)[1][:, 0] == exact).float().mean().item()
+        recall8 = (flat8.search(probes, k=1)[1][:, 0] == exact).float().mean().item()
+
+        print(f"--- {size} identities, {args.probes} probes per query ---")
+        print(f"brute force     {time_ms(lambda: brute_force(embeddings, probes), args.runs):8.2f} ms")
+        print(f"flat fp32       {time_ms(lambda: flat.search(probes, k=5), args.runs):8.2f} ms")
+        print(f"flat fp16       {time_ms(lambda: flat16.search(probes, k=5), args.runs):8.2f} ms")
+        print(f"flat int8       {time_ms(lambda: flat8.search(probes, k=5), args.runs):8.2f} ms | recall@1 {recall8:.2f}")
+        print(
+            f"ivf ({n_lists} lists, probe {args.n_probe}) "
+            f"{time_ms(lambda: ivf.search(probes, k=5), args.runs):8.2f} ms | recall@1 {recall:.2f}"
+        )
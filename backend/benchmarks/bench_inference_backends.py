@@ -0,0 +1,94 @@
+"""Embedding and detector backends: parity with eager and per-face latency.
+
+Builds every EMBEDDING_BACKEND, checks its output against the eager model
+(max abs diff, min cosine) and times batches of face crops. With an image,
+the traced detector is compared to the eager MTCNN on that frame too.
+Run from the backend directory:
+    python -m benchmarks.bench_inference_backends --backends eager torchscript onnx --batch-sizes 1 8 32
+    python -m benchmarks.bench_inference_backends --image path/to/frame.jpg
+"""
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from facenet_pytorch import MTCNN
+
+from utils.inference_backends import BACKENDS, EagerBackend, FACE_SHAPE, optimize_detector
+from utils.model_registry import device, get_resnet, inference_context
+
+
+def timed(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def compare_embedders(names, batch_sizes, repeats):
+    resnet = get_resnet()
+    eager = EagerBackend(resnet)
+    faces = torch.randn((max(batch_sizes), *FACE_SHAPE), generator=torch.Generator().manual_seed(0))
+    expected = eager(faces).float().cpu()
+
+    print(f"{'backend':>12} {'build s':>8} {'max diff':>9} {'min cos':>9} {'batch':>6} {'ms/face':>8} {'faces/s':>8}")
+    for name in names:
+        start = time.perf_counter()
+        try:
+            backend = eager if name == "eager" else BACKENDS[name](resnet)
+            actual = backend(faces).float().cpu()
+        except Exception as e:
+            print(f"{name:>12} unavailable: {e}")
+            continue
+        build = time.perf_counter() - start
+
+        diff = (expected - actual).abs().max().item()
+        cosine = F.cosine_similarity(expected, actual).min().item()
+        for batch_size in batch_sizes:
+            batch = faces[:batch_size]
+            seconds = timed(lambda: backend(batch), repeats)
+            print(
+                f"{name:>12} {build:>8.2f} {diff:>9.2e} {cosine:>9.6f} {batch_size:>6} "
+                f"{seconds * 1000 / batch_size:>8.2f} {batch_size / seconds:>8.1f}"
+            )
+
+
+def compare_detectors(image, repeats):
+    eager = MTCNN(device=device)
+    traced = optimize_detector(MTCNN(device=device), "torchscript")
+
+    with inference_context():
+        boxes, probs = eager.detect(image)
+        traced_boxes, traced_probs = traced.detect(image)
+    if boxes is None or traced_boxes is None:
+        print(f"detector faces: eager {boxes is not None}, torchscript {traced_boxes is not None}")
+    else:
+        print(
+            f"detector faces: eager {len(boxes)}, torchscript {len(traced_boxes)}, "
+            f"max box diff {abs(boxes - traced_boxes).max():.2e}, max prob diff {abs(probs - traced_probs).max():.2e}"
+        )
+
+    for name, mtcnn in (("eager", eager), ("torchscript", traced)):
+        def detect():
+            with inference_context():
+                mtcnn.detect(image)
+        print(f"detector {name:>12}: {timed(detect, repeats) * 1000:.1f} ms/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--image", help="frame for the detector comparison")
+    args = parser.parse_args()
+
+    compare_embedders(args.backends, args.batch_sizes, args.repeats)
+    if args.image:
+        compare_detectors(Image.open(args.image).convert("RGB"), args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Throughput of N concurrent camera streams: per-call executor vs micro-batching.
+
+"executor" mimics the old websocket path (run_in_executor(None, predict_image)
+per frame), "service" sends the same frames through inference_service.
+Run from the backend directory:
+    python -m benchmarks.bench_inference_service path/to/face.jpg --streams 1 4 8
+"""
+import argparse
+import asyncio
+import time
+
+from PIL import Image
+
+from controllers.students_pred import predict_image
+from utils import inference_service
+from utils.model_registry import warmup
+
+
+async def stream_executor(image, frames):
+    loop = asyncio.get_running_loop()
+    for _ in range(frames):
+        await loop.run_in_executor(None, predict_image, image)
+
+
+async def stream_service(image, frames):
+    for _ in range(frames):
+        await inference_service.predict(image)
+
+
+async def run(stream_fn, image, streams, frames):
+    start = time.perf_counter()
+    await asyncio.gather(*(stream_fn(image, frames) for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    return streams * frames / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--frames", type=int, default=10)
+    args = parser.parse_args()
+
+    image = Image.open(args.image).convert("RGB")
+    warmup()
+
+    print(f"{'streams':>8} {'executor fps':>13} {'service fps':>12}")
+    for streams in args.streams:
+        executor_fps = await run(stream_executor, image, streams, args.frames)
+        service_fps = await run(stream_service, image, streams, args.frames)
+        print(f"{streams:>8} {executor_fps:>13.2f} {service_fps:>12.2f}")
+
+    print(inference_service.get_metrics())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
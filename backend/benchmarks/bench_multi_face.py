@@ -0,0 +1,65 @@
+"""Embedding + matching cost per frame as the number of faces grows.
+
+Compares the old per-face loop (one ResNet call and one norm per face)
+with the batched path used by predict_faces. Run from the backend directory:
+    python -m benchmarks.bench_multi_face path/to/face.jpg --faces 1 2 4 8 16
+"""
+import argparse
+import statistics
+import time
+
+import torch
+from PIL import Image
+
+from utils.model_registry import device, get_mtcnn, get_resnet
+
+
+def looped(faces, gallery):
+    resnet = get_resnet()
+    for face in faces:
+        emb = resnet(face.unsqueeze(0).to(device)).detach()
+        dist_list = (gallery - emb).norm(dim=1)
+        torch.min(dist_list, dim=0)
+
+
+def batched(faces, gallery):
+    resnet = get_resnet()
+    embs = resnet(faces.to(device)).detach()
+    torch.min(torch.cdist(embs, gallery), dim=1)
+
+
+def time_fn(fn, faces, gallery, runs):
+    fn(faces, gallery)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(faces, gallery)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--gallery", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    img = Image.open(args.image).convert("RGB")
+    # Aligned, standardized crop of the largest face
+    crop = get_mtcnn()(img)
+    if crop is None:
+        raise SystemExit("No face found in the benchmark image")
+
+    gallery = torch.nn.functional.normalize(torch.randn(args.gallery, 512), dim=1).to(device)
+
+    with torch.no_grad():
+        for n in args.faces:
+            faces = crop.unsqueeze(0).repeat(n, 1, 1, 1)
+            loop_ms = time_fn(looped, faces, gallery, args.runs)
+            batch_ms = time_fn(batched, faces, gallery, args.runs)
+            print(
+                f"{n:>3} faces | loop {loop_ms:8.2f} ms ({loop_ms / n:6.2f}/face) | "
+                f"batched {batch_ms:8.2f} ms ({batch_ms / n:6.2f}/face)"
+            )
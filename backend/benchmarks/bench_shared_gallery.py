@@ -0,0 +1,116 @@
+"""Gallery memory and hot reload across worker processes, private vs shared.
+
+Fills a temporary embedding store with --rows random embeddings and starts
+--workers processes that open it and build the gallery like students_pred
+does: a private float32 copy per worker, or the shared read-only map of the
+store (SHARED_GALLERY=1). Each worker reports what the gallery added to its
+memory (private bytes are paid per worker, PSS is its share of the host's
+memory, from /proc/self/smaps_rollup, so Linux only) and its search latency.
+Then this process enrolls one more id and every worker reports how long its
+refresh() polling took to see it and how long the rebuild took.
+Run from the backend directory:
+    python -m benchmarks.bench_shared_gallery --rows 100000 --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import torch
+
+from utils.embedding_store import EmbeddingStore
+from utils.gallery_index import GalleryIndex
+
+
+def memory_mb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return fields["Pss"], fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def build(store, shared):
+    vectors, ids = store.snapshot()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        embeddings = torch.from_numpy(np.asarray(vectors))
+    return GalleryIndex(embeddings, ids, shared=shared)
+
+
+def worker(root, shared, new_id, ready, results):
+    torch.set_num_threads(1)
+    store = EmbeddingStore(root)
+    probes = torch.randn((8, 512), generator=torch.Generator().manual_seed(1))
+
+    pss, private = memory_mb()
+    gallery = build(store, shared)
+    gallery.search(probes)
+    start = time.perf_counter()
+    for _ in range(10):
+        gallery.search(probes)
+    search_ms = (time.perf_counter() - start) * 100
+    after_pss, after_private = memory_mb()
+    ready.put((after_pss - pss, after_private - private, search_ms))
+
+    while True:
+        if store.refresh():
+            seen = time.time()
+            start = time.perf_counter()
+            gallery = build(store, shared)
+            rebuild_ms = (time.perf_counter() - start) * 1000
+            if new_id in gallery.rows:
+                results.put((seen, rebuild_ms))
+                return
+        time.sleep(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    context = mp.get_context("spawn")
+    rng = np.random.default_rng(0)
+    print(f"{args.rows} rows ({args.rows * 512 * 4 / 2**20:.0f} MB float32), {args.workers} workers")
+    print(f"{'gallery':>8} {'PSS MB':>9} {'private MB':>11} {'search ms':>10} {'seen after ms':>14} {'rebuild ms':>11}")
+
+    for shared in (False, True):
+        with tempfile.TemporaryDirectory() as root:
+            store = EmbeddingStore(root)
+            vectors = rng.standard_normal((args.rows, 512), dtype=np.float32)
+            store.replace_all(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), [f"S{i}" for i in range(args.rows)])
+
+            ready, results = context.Queue(), context.Queue()
+            workers = [
+                context.Process(target=worker, args=(root, shared, "NEW", ready, results))
+                for _ in range(args.workers)
+            ]
+            for process in workers:
+                process.start()
+            loaded = [ready.get() for _ in workers]
+
+            written = time.time()
+            store.upsert("NEW", rng.standard_normal(512, dtype=np.float32))
+            reloads = [results.get() for _ in workers]
+            for process in workers:
+                process.join()
+
+            pss = sum(row[0] for row in loaded)
+            private = sum(row[1] for row in loaded)
+            search_ms = np.mean([row[2] for row in loaded])
+            seen_ms = max(seen - written for seen, _ in reloads) * 1000
+            rebuild_ms = np.mean([rebuild for _, rebuild in reloads])
+            print(
+                f"{'shared' if shared else 'private':>8} {pss:>9.1f} {private:>11.1f} "
+                f"{search_ms:>10.2f} {seen_ms:>14.1f} {rebuild_ms:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
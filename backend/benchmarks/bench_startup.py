@@ -0,0 +1,106 @@
+"""Worker cold start: import time of the app, model loading, weight formats.
+
+Every measurement runs in a fresh interpreter. "import main" is what uvicorn
+waits for before the API answers, "import main + ML" what it waited for when
+the routes imported torch, facenet_pytorch and the gallery, and
+"import main + models" is when /ready turns 200. The weight rows compare
+facenet_pytorch's pretrained checkpoint (unpickled into the randomly
+initialised model) with the memory-mapped RESNET_WEIGHTS_PATH file. Ends with the slowest imports of
+"import main" from python -X importtime. Run from the backend directory:
+    python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+IMPORT_APP = """
+import time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(elapsed, "torch" in sys.modules)
+"""
+
+# What importing the routes used to cost: the ML modules and the gallery
+IMPORT_ML = """
+import time
+start = time.perf_counter()
+import main
+from utils import inference_service
+print(time.perf_counter() - start)
+"""
+
+MODELS_READY = """
+import time
+start = time.perf_counter()
+import main
+from utils import model_loader
+model_loader.start().result()
+print(time.perf_counter() - start)
+"""
+
+PRETRAINED_WEIGHTS = """
+import time
+from facenet_pytorch import InceptionResnetV1
+start = time.perf_counter()
+InceptionResnetV1(pretrained="vggface2").eval()
+print(time.perf_counter() - start)
+"""
+
+MMAP_WEIGHTS = """
+import time
+from utils.model_registry import RESNET_WEIGHTS_PATH, load_resnet
+if not RESNET_WEIGHTS_PATH.exists():
+    raise SystemExit(f"{RESNET_WEIGHTS_PATH} missing, run python -m utils.model_registry first")
+start = time.perf_counter()
+load_resnet().eval()
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, *flags):
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", "import sys\n" + code],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+    return result
+
+
+def measure(code, runs):
+    # Best of runs; the script prints its measurement on the last line
+    return min(float(run(code).stdout.strip().splitlines()[-1].split()[0]) for _ in range(runs))
+
+
+def slowest_imports(count):
+    # -X importtime writes "import time: self | cumulative | module" to stderr
+    rows = []
+    for line in run("import main", "-X", "importtime").stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    torch_imported = run(IMPORT_APP).stdout.strip().splitlines()[-1].split()[1]
+    print(f"import main            {measure(IMPORT_APP, args.runs):6.2f} s  (torch imported: {torch_imported})")
+    print(f"import main + ML       {measure(IMPORT_ML, args.runs):6.2f} s")
+    print(f"import main + models   {measure(MODELS_READY, args.runs):6.2f} s")
+    print(f"weights, pretrained    {measure(PRETRAINED_WEIGHTS, args.runs):6.2f} s")
+    print(f"weights, mmap artifact {measure(MMAP_WEIGHTS, args.runs):6.2f} s")
+
+    print("\nslowest imports of 'import main' (cumulative ms):")
+    for micros, module in slowest_imports(args.top):
+        print(f"{micros / 1000:9.1f}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,98 @@
 import base64
+import warnings
 from PIL import Image
-import io
-from pathlib import Path
 import os
 import torch
-import torch.nn.functional as F
 import numpy as np
-from facenet_pytorch import MTCNN, InceptionResnetV1
-from matplotlib import pyplot as plt
+from facenet_pytorch import extract_face, fixed_image_standardization
+from utils.model_registry import device, get_mtcnn, inference_context
+from utils.inference_backends import get_embedder
+from utils.frame_preprocess import BLUR_THRESHOLD, decode_frame, prepare_frame
+from utils.detection_profiles import get_profile
+from utils.gallery_index import GalleryIndex
+from utils.embedding_store import get_store, EMBEDDINGS_STORE_PATH
 
-env_file = Path(__file__).resolve().parent.parent
+GALLERY_METRIC = os.getenv("GALLERY_METRIC", "l2")
+GALLERY_DTYPES = {"float32": torch.float32, "float16": torch.float16, "int8": torch.int8}
+GALLERY_DTYPE = GALLERY_DTYPES.get(os.getenv("GALLERY_DTYPE", "float32"), torch.float32)
+GALLERY_IVF_LISTS = int(os.getenv("GALLERY_IVF_LISTS", "0"))
+GALLERY_IVF_PROBE = int(os.getenv("GALLERY_IVF_PROBE", "8"))
+# float32 CPU galleries search the store's memory map in place, one copy per host
+SHARED_GALLERY = os.getenv("SHARED_GALLERY", "1" if os.name == "posix" else "0")
 
-MODELS_PATH = os.getenv("MODELS_PATH")
-if MODELS_PATH:
-    SAVED_EMBADDINGS_PATH = Path(MODELS_PATH) / "embaddings.pt"
-else:
-    SAVED_EMBADDINGS_PATH = env_file / "face_detection_models" / "embaddings.pt"
+# L2 distance between unit embeddings; lowered from 0.8 to reduce false positives
+MATCH_THRESHOLD = 0.65
+MIN_FACE_CONFIDENCE = 0.85
+MATCH_MESSAGE = "Prediction successful."
 
-embadding_list = None
-name_list = None
+gallery = None
+# Store version the gallery was built from, see sync_gallery
+gallery_version = -1
 
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
-mtcnn = MTCNN(device=device, keep_all=False, min_face_size=20)
-resnet = InceptionResnetV1(pretrained="vggface2").eval().to(device)
+def _store_tensor(vectors):
+    # The store maps its vectors read-only; nothing writes through this tensor
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.from_numpy(np.asarray(vectors))
 
 
 def load_embaddings():
-    global embadding_list, name_list
-    if os.path.exists(SAVED_EMBADDINGS_PATH):
-        saved_data = torch.load(SAVED_EMBADDINGS_PATH)
-        embadding_list = saved_data[0].to(device)
-        name_list = saved_data[1]
-        print(f"Loaded {len(name_list)} embeddings from {SAVED_EMBADDINGS_PATH}")
+    global gallery, gallery_version
+    store = get_store()
+    store.refresh()
+    version = store.version
+    vectors, ids = store.snapshot()
+    if any(id_ is not None for id_ in ids):
+        gallery = GalleryIndex(
+            _store_tensor(vectors),
+            ids,
+            metric=GALLERY_METRIC,
+            dtype=GALLERY_DTYPE,
+            device=device,
+            n_lists=GALLERY_IVF_LISTS,
+            n_probe=GALLERY_IVF_PROBE,
+            shared=SHARED_GALLERY == "1" and GALLERY_DTYPE == torch.float32 and device.type == "cpu",
+            # Rebuilds keep the IVF partitions instead of retraining them
+            centroids=gallery.centroids if gallery is not None else None,
+        )
+        gallery_version = version
+        print(f"Loaded {len(gallery)} embeddings from {EMBEDDINGS_STORE_PATH} (version {version})")
+        return True
 
     else:
-        print(f"No saved embeddings found at {SAVED_EMBADDINGS_PATH}")
+        gallery = None
+        gallery_version = version
+        print(f"No saved embeddings found at {EMBEDDINGS_STORE_PATH}")
+        return False
+
+
+def sync_gallery():
+    # Enrollments written by any worker of the host reach this worker's
+    # gallery before its next search
+    store = get_store()
+    store.refresh()
+    if store.version != gallery_version:
+        load_embaddings()
+
+
+def _patch_gallery(change):
+    # This worker's own store write is the only change since the gallery was
+    # built: patch a private gallery in place, otherwise rebuild from the store
+    global gallery_version
+    version = get_store().version
+    if version == gallery_version:
+        return gallery is not None
+    if gallery is not None and not gallery.shared and version == gallery_version + 1:
+        change(gallery)
+        gallery_version = version
+        return True
+    return load_embaddings()
+
+
+def update_gallery(enrollment_number, embadding):
+    # Apply one enrollment to the live gallery without reloading the store
+    return _patch_gallery(lambda g: g.upsert(enrollment_number, torch.as_tensor(embadding)))
 
 
 load_embaddings()
@@ -47,93 +104,206 @@ def base64_to_image(base64_str):
             base64_str = base64_str.split("base64,")[1]
 
         image_data = base64.b64decode(base64_str)
-        return Image.open(io.BytesIO(image_data)).convert("RGB")
+        return decode_frame(image_data)
     except Exception as e:
         print(f"Error converting image: {e}")
         return None
 
 
-def get_blur_score(image):
-    # Convert PIL image to grayscale numpy array
-    img_gray = np.array(image.convert('L'))
-    
-    # Convert to tensor and add batch/channel dims: (1, 1, H, W)
-    img_tensor = torch.from_numpy(img_gray).float().unsqueeze(0).unsqueeze(0).to(device)
-    
-    # Laplacian kernel
-    kernel = torch.tensor([
-        [0, 1, 0],
-        [1, -4, 1],
-        [0, 1, 0]
-    ], dtype=torch.float32).unsqueeze(0).unsqueeze(0).to(device)
-    
-    # Apply convolution
-    filtered = F.conv2d(img_tensor, kernel)
-    
-    # Calculate variance
-    return filtered.var().item()
+def bytes_to_image(image_bytes):
+    # Binary websocket frames carry the raw JPEG, no base64 or data URL prefix
+    try:
+        return decode_frame(image_bytes)
+    except Exception as e:
+        print(f"Error converting image: {e}")
+        return None
 
 
-def predict_image(image):
-    global embadding_list, name_list
+def detect_batch(frames, mtcnn=None):
+    # MTCNN detection for many uint8 HxWx3 frames (PIL images or pixel tensors
+    # from prepare_frame): frames of the same size (usually one camera) are
+    # stacked and run through the cascade together.
+    mtcnn = mtcnn or get_mtcnn()
+    frames = [f if isinstance(f, torch.Tensor) else torch.from_numpy(np.array(f)) for f in frames]
+    detections = [None] * len(frames)
+
+    by_size = {}
+    for i, pixels in enumerate(frames):
+        by_size.setdefault(tuple(pixels.shape), []).append(i)
+
+    for indices in by_size.values():
+        if len(indices) == 1:
+            batch = frames[indices[0]]
+        else:
+            batch = torch.stack([frames[i] for i in indices])
+        with inference_context():
+            boxes, probs = mtcnn.detect(batch)
+        if len(indices) == 1:
+            boxes, probs = [boxes], [probs]
+        for i, frame_boxes, frame_probs in zip(indices, boxes, probs):
+            detections[i] = (frame_boxes, frame_probs)
+
+    return detections
+
+
+def detect_regions(frames):
+    # frames: list of (pixels, profile, roi). Each frame is cropped to its
+    # region of interest, frames sharing a profile go through detect_batch
+    # together and the boxes are shifted back to frame coordinates.
+    detections = [None] * len(frames)
+    by_profile = {}
+    for i, (pixels, profile, roi) in enumerate(frames):
+        x1, y1, x2, y2 = profile.region(pixels.shape[1], pixels.shape[0], roi)
+        by_profile.setdefault(profile.name, (profile, []))[1].append((i, pixels[y1:y2, x1:x2], x1, y1))
+
+    for profile, crops in by_profile.values():
+        detected = detect_batch([crop for _, crop, _, _ in crops], profile.mtcnn())
+        for (i, _, x1, y1), (boxes, probs) in zip(crops, detected):
+            if boxes is not None and (x1 or y1):
+                boxes = boxes + np.array([x1, y1, x1, y1], dtype=boxes.dtype)
+            detections[i] = (boxes, probs)
+
+    return detections
+
+
+def detect_frames(requests):
+    # requests: list of (image, profile, roi), profile None for the default
+    # profile and roi None for the profile's own region. Blur check + batched
+    # detection. Returns, per image, (resized image, boxes, probs, rejection)
+    # where rejection is the result tuple for frames that cannot be
+    # recognized (blurry, no face) and None otherwise.
+    detections = [None] * len(requests)
+    frames = []
+    for i, (image, profile, roi) in enumerate(requests):
+        # 1. Blur Detection
+        image, pixels, blur_score = prepare_frame(image)
+        print(f"Blur Score: {blur_score}")
+        if blur_score < BLUR_THRESHOLD:
+            print("Image rejected due to blur")
+            detections[i] = (image, None, None, ("Unknown", 0, "Image too blurry", None))
+        else:
+            frames.append((i, image, pixels, profile or get_profile(), roi))
+
+    if frames:
+        detected = detect_regions([(pixels, profile, roi) for _, _, pixels, profile, roi in frames])
+        # A tracked region that lost its faces: search the profile's full region
+        retry = [k for k, (boxes, _) in enumerate(detected) if boxes is None and frames[k][4] is not None]
+        if retry:
+            redetected = detect_regions([(frames[k][2], frames[k][3], None) for k in retry])
+            for k, detection in zip(retry, redetected):
+                detected[k] = detection
+
+        for (i, image, _, _, _), (boxes, probs) in zip(frames, detected):
+            if boxes is None:
+                print("MTCNN failed to detect face")
+                detections[i] = (image, None, None, ("no face", 0, "No face detected", None))
+            else:
+                detections[i] = (image, boxes, probs, None)
 
-    if embadding_list is None or name_list is None:
+    return detections
+
+
+def low_confidence(box, confidence):
+    # 2. Stricter Face Detection Confidence
+    if confidence < MIN_FACE_CONFIDENCE:
+        print(f"Face rejected due to low confidence: {confidence}")
+        return ("Unknown", 0, f"Low confidence ({confidence:.2f})", box.tolist())
+    return None
+
+
+def identify_faces(items):
+    # items: list of (image, box). All crops go through one ResNet batch and
+    # one gallery search. Returns (enrollment_number, distance, message) each.
+    sync_gallery()
+    if gallery is None or len(gallery) == 0:
         if not load_embaddings():
-            return "error", 0, "Database not found.", None
+            return [("error", 0, "Database not found.")] * len(items)
 
-    # 1. Blur Detection
-    # Resize for performance if image is too large
-    if image.size[0] > 640:
-        ratio = 640 / image.size[0]
-        new_height = int(image.size[1] * ratio)
-        image = image.resize((640, new_height), Image.Resampling.LANCZOS)
+    mtcnn = get_mtcnn()
+    faces = []
+    for image, box in items:
+        face = extract_face(image, box, mtcnn.image_size, mtcnn.margin)
+        if mtcnn.post_process:
+            face = fixed_image_standardization(face)
+        faces.append(face)
 
-    blur_score = get_blur_score(image)
-    print(f"Blur Score: {blur_score}")
-    if blur_score < 50:  # Threshold for blurriness
-        print("Image rejected due to blur")
-        return "Unknown", 0, "Image too blurry", None
+    embaddings = get_embedder()(torch.stack(faces).to(device))
 
-    try:
-        # Detect faces and get bounding boxes
-        boxes, probs = mtcnn.detect(image)
-        
-        if boxes is None:
-            print("MTCNN failed to detect face")
-            return "no face", 0, "No face detected", None
-
-        # Get the largest face
-        box = boxes[0]
-        
-        # Crop the face
-        img_cropped = mtcnn(image)
-        
-        if img_cropped is None:
-            return "no face", 0, "No face detected", None
-        
-        confidence = probs[0] if probs is not None else 0
-
-        # 2. Stricter Face Detection Confidence
-        if confidence < 0.85:
-            print(f"Face rejected due to low confidence: {confidence}")
-            return "Unknown", 0, f"Low confidence ({confidence:.2f})", box.tolist()
-
-        image_embadding = resnet(img_cropped.unsqueeze(0).to(device)).detach()
-
-        dist_list = (embadding_list - image_embadding).norm(dim=1)
-        min_dist, min_idx = torch.min(dist_list, dim=0)
-
-        # 3. Stricter Matching Threshold
-        threshold = 0.65  # Lowered from 0.8 to reduce false positives
-
-        if min_dist.item() < threshold:
-            name = name_list[min_idx]
-            return name, min_dist.item(), "Prediction successful.", box.tolist()
+    # One gallery for the whole batch, a sync may swap in a rebuilt one. The
+    # names come with the search so a concurrent enrollment cannot shift them.
+    index = gallery
+    scores, indices, names = index.search_names(embaddings, k=1)
+    matched = index.matches(scores[:, 0], MATCH_THRESHOLD).tolist()
+    # Replies report an L2 distance whatever GALLERY_METRIC is
+    distances = index.distances(scores[:, 0]).tolist()
+
+    # 3. Stricter Matching Threshold
+    identities = []
+    for distance, idx, is_match in zip(distances, indices[:, 0].tolist(), matched):
+        if is_match:
+            identities.append((names[idx], distance, MATCH_MESSAGE))
         else:
-            return "Unknown", min_dist.item(), "No match found.", box.tolist()
+            identities.append(("Unknown", distance, "No match found."))
+    return identities
+
+
+def predict_batch(requests):
+    # requests: list of (image, multi_face, profile, roi), see detect_frames
+    # for profile and roi. Every frame is detected in as few
+    # MTCNN passes as possible, all accepted faces of all frames go through
+    # one ResNet batch and one gallery search. Returns, per request, a
+    # (enrollment_number, distance, message, box) tuple, or a list of them
+    # when multi_face is set.
+    def wrap(result, multi_face):
+        return [result] if multi_face else result
+
+    sync_gallery()
+    if gallery is None or len(gallery) == 0:
+        if not load_embaddings():
+            return [wrap(("error", 0, "Database not found.", None), multi) for _, multi, _, _ in requests]
+
+    try:
+        detections = detect_frames([(image, profile, roi) for image, _, profile, roi in requests])
+
+        results = [None] * len(requests)
+        pending = []
+        for i, ((image, boxes, probs, rejection), (_, multi_face, _, _)) in enumerate(zip(detections, requests)):
+            if rejection is not None:
+                results[i] = wrap(rejection, multi_face)
+                continue
+
+            # Single-face mode only looks at the largest face
+            if not multi_face:
+                boxes, probs = boxes[:1], probs[:1]
+
+            faces = [low_confidence(box, confidence) for box, confidence in zip(boxes, probs)]
+            pending.extend((i, j, image, box) for j, box in enumerate(boxes) if faces[j] is None)
+            results[i] = faces
+
+        if pending:
+            identities = identify_faces([(image, box) for _, _, image, box in pending])
+            for (i, j, _, box), identity in zip(pending, identities):
+                results[i][j] = (*identity, box.tolist())
+
+        for i, (_, multi_face, _, _) in enumerate(requests):
+            if not multi_face and isinstance(results[i], list):
+                results[i] = results[i][0]
+
+        return results
     except Exception as e:
         print(f"Error during prediction: {e}")
-        return "Error", 0, str(e), None
+        return [wrap(("Error", 0, str(e), None), multi) for _, multi, _, _ in requests]
+
+
+def predict_image(image):
+    return predict_batch([(image, False, None, None)])[0]
+
+
+def predict_faces(image):
+    # Multi-face variant of predict_image: every detected face is embedded in
+    # one batched ResNet pass and matched against the gallery in one search.
+    # Returns a list of (enrollment_number, distance, message, box) tuples.
+    return predict_batch([(image, True, None, None)])[0]
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import text, exc
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
 
@@ -12,7 +14,64 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set in environment variables")
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# Pool sizing: every camera holds at most one connection at a time (roster
+# load, attendance flush) and the dashboard adds a few, so
+# DB_POOL_SIZE + DB_MAX_OVERFLOW should cover cameras + dashboard clients.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Prepared statements kept per asyncpg connection (0 when behind pgbouncer)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+pool_counters = {
+    "checkouts": 0,
+    "waits": 0,
+    "checkouts_in_overflow": 0,
+    "timeouts": 0,
+    "total_wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # Counts checkouts that had to wait for a connection to be returned, so
+    # pool saturation shows up as waits/timeouts
+    def _do_get(self):
+        blocked = self._pool.empty() and -1 < self._max_overflow <= self.overflow()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_counters["timeouts"] += 1
+            raise
+
+        pool_counters["checkouts"] += 1
+        if blocked:
+            waited = time.perf_counter() - start
+            pool_counters["waits"] += 1
+            pool_counters["total_wait_seconds"] += waited
+            pool_counters["max_wait_seconds"] = max(pool_counters["max_wait_seconds"], waited)
+        if self.overflow() > 0:
+            pool_counters["checkouts_in_overflow"] += 1
+        return connection
+
+
+engine_options = {}
+if DATABASE_URL.startswith("postgresql+asyncpg"):
+    engine_options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+if not DATABASE_URL.startswith("sqlite") or ":memory:" not in DATABASE_URL:
+    engine_options.update(
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+engine = create_async_engine(DATABASE_URL, echo=False, future=True, **engine_options)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
@@ -20,3 +79,72 @@ Base = declarative_base()
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def pool_stats():
+    pool = engine.pool
+    stats = {
+        "pool_class": type(pool).__name__,
+        "status": pool.status(),
+    }
+    if isinstance(pool, InstrumentedPool):
+        waits = pool_counters["waits"]
+        stats.update(
+            size=pool.size(),
+            max_overflow=DB_MAX_OVERFLOW,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            saturated=pool.checkedout() >= pool.size() + DB_MAX_OVERFLOW,
+            checkouts=pool_counters["checkouts"],
+            waits=waits,
+            checkouts_in_overflow=pool_counters["checkouts_in_overflow"],
+            timeouts=pool_counters["timeouts"],
+            avg_wait_ms=round(pool_counters["total_wait_seconds"] / waits * 1000, 3) if waits else 0,
+            max_wait_ms=round(pool_counters["max_wait_seconds"] * 1000, 3),
+        )
+    return stats
+
+
+# pg_advisory_xact_lock key of the startup migrations
+SCHEMA_LOCK_KEY = 7314092025
+
+
+async def lock_schema(conn):
+    # Workers started together run create_all, upgrade_schema and the rollup
+    # backfill at once. The first one to take this lock migrates; the others
+    # wait until its transaction commits and then find nothing left to do.
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+async def upgrade_schema(conn):
+    # create_all only creates missing tables; bring existing Postgres tables
+    # up to the current model. Every step is a no-op once applied.
+    if conn.dialect.name != "postgresql":
+        return
+    await lock_schema(conn)
+
+    has_day = await conn.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'attendance' AND column_name = 'day'"
+    ))
+    if has_day.first() is None:
+        print("Adding attendance.day and backfilling it")
+        await conn.execute(text("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS day DATE"))
+        await conn.execute(text("UPDATE attendance SET day = date::date"))
+        await conn.execute(text("ALTER TABLE attendance ALTER COLUMN day SET DEFAULT CURRENT_DATE"))
+        await conn.execute(text("ALTER TABLE attendance ALTER COLUMN day SET NOT NULL"))
+        # Keep the first mark per student/day/slot so the unique index can be built
+        await conn.execute(text(
+            "DELETE FROM attendance a USING attendance b "
+            "WHERE a.student_id = b.student_id AND a.day = b.day "
+            "AND a.time_slot = b.time_slot AND a.id > b.id"
+        ))
+
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_student_day_slot "
+        "ON attendance (student_id, day, time_slot)"
+    ))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_attendance_day_slot ON attendance (day, time_slot)"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_attendance_date ON attendance (date)"))
@@ -1,27 +1,21 @@
 import torch
-from facenet_pytorch import MTCNN, InceptionResnetV1
 from torchvision import datasets
-from torch.utils.data import DataLoader
+import argparse
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv()
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.model_registry import device
+from utils.embedding_pipeline import embed_images
+from utils.embedding_store import get_store, EMBEDDINGS_STORE_PATH
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"Using device: {device}")
 
-mtcnn = MTCNN(device=device)
 
-resnet = InceptionResnetV1(pretrained="vggface2").eval().to(device)
-
-
-def collate_fn(x):
-    return x[0]
-
-
-
-def build_database_centroid():
+def build_database_centroid(num_workers=None, detect_batch_size=8, resnet_batch_size=32):
     env_path = os.getenv("IMAGES_PATH")
     current_file_parent  = Path(__file__).resolve().parent
     datasets_path = (current_file_parent.parent / env_path).resolve() 
@@ -33,24 +27,25 @@ def build_database_centroid():
     dataset = datasets.ImageFolder(str(datasets_path))
 
     dataset.index_to_class = {i: c for c, i in dataset.class_to_idx.items()}
-    loader = DataLoader(dataset, collate_fn=collate_fn)
+    image_paths = [path for path, _ in dataset.samples]
 
-    tmp_embaddings = {}
-
-    print("Building embeddings...")
-
-    for x, y in loader:
-        enrollment_number = dataset.index_to_class[y]
-        x_aligned, prob = mtcnn(x, return_prob=True)
+    if num_workers is None:
+        num_workers = min(8, os.cpu_count() or 1)
 
-        if x_aligned is not None and prob > 0.90:
-            x_aligned = x_aligned.unsqueeze(0).to(device)
-            embadding = resnet(x_aligned).detach().cpu()
+    print(f"Building embeddings for {len(image_paths)} images...")
 
-            if enrollment_number not in tmp_embaddings:
-                tmp_embaddings[enrollment_number] = []
+    embaddings = embed_images(
+        image_paths,
+        num_workers=num_workers,
+        detect_batch_size=detect_batch_size,
+        resnet_batch_size=resnet_batch_size,
+        report_every=100,
+    )
 
-            tmp_embaddings[enrollment_number].append(embadding)
+    tmp_embaddings = {}
+    for (_, y), embadding in zip(dataset.samples, embaddings):
+        if embadding is not None:
+            tmp_embaddings.setdefault(dataset.index_to_class[y], []).append(embadding)
 
     final_embaddings = []
     final_name = []
@@ -58,19 +53,25 @@ def build_database_centroid():
     print("Averaging vectors per student...")
 
     for name, vector_list in tmp_embaddings.items():
-        if len(vector_list) > 0:
-            stacked_vectors = torch.cat(vector_list)
-            mean_embadding = torch.mean(stacked_vectors, dim=0)
-            final_embaddings.append(mean_embadding)
-            final_name.append(name)
+        stacked_vectors = torch.stack(vector_list)
+        mean_embadding = torch.mean(stacked_vectors, dim=0)
+        final_embaddings.append(torch.nn.functional.normalize(mean_embadding, p=2, dim=0))
+        final_name.append(name)
 
-        if len(final_embaddings) > 0:
-            final_embaddings_tensor = torch.stack(final_embaddings)
-            torch.save([final_embaddings_tensor, final_name], "embaddings.pt")
-            print("Embaddings saved to embaddings.pt")
-        else:
-            print("No face found to build embeddings.")
+    if len(final_embaddings) > 0:
+        # One write for the whole re-index
+        final_embaddings_tensor = torch.stack(final_embaddings)
+        get_store().replace_all(final_embaddings_tensor.numpy(), final_name)
+        print(f"Embaddings for {len(final_name)} students saved to {EMBEDDINGS_STORE_PATH}")
+    else:
+        print("No face found to build embeddings.")
 
 
 if __name__ == "__main__":
-    build_database_centroid()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="image decoding workers")
+    parser.add_argument("--detect-batch", type=int, default=8)
+    parser.add_argument("--resnet-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    build_database_centroid(args.workers, args.detect_batch, args.resnet_batch)
@@ -1,33 +1,29 @@
+import numpy as np
 import torch
-from facenet_pytorch import MTCNN, InceptionResnetV1
 from PIL import Image
 import os
 import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.model_registry import device, get_mtcnn, get_resnet, inference_context
+from utils.gallery_index import GalleryIndex
+from utils.embedding_store import get_store, EMBEDDINGS_STORE_PATH
 
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 print(f"Running on device: {device}")
 
-mtcnn = MTCNN(
-    image_size=160,
-    margin=0,
-    min_face_size=20,
-    thresholds=[0.6, 0.7, 0.7],
-    factor=0.709,
-    post_process=True,
-    device=device,
-)
-
-resnet = InceptionResnetV1(pretrained="vggface2").eval().to(device)
-
-SAVED_DATA_PATH = "embaddings.pt"
-
-if os.path.exists(SAVED_DATA_PATH):
-    saved_data = torch.load(SAVED_DATA_PATH)
-    embedding_list = saved_data[0].to(device)
-    name_list = saved_data[1]
-    print(f"Loaded {len(name_list)} students from database.")
+mtcnn = get_mtcnn()
+
+resnet = get_resnet()
+
+store = get_store()
+
+if len(store):
+    vectors, ids = store.snapshot()
+    gallery = GalleryIndex(torch.from_numpy(np.array(vectors)), ids, device=device)
+    print(f"Loaded {len(gallery)} students from database.")
 else:
-    print(f"Error: {SAVED_DATA_PATH} not found. Run training first.")
+    print(f"Error: no embeddings in {EMBEDDINGS_STORE_PATH}. Run build_embeddings.py first.")
     sys.exit()
 
 
@@ -38,24 +34,25 @@ def predict_face(image_path):
         print(f"Could not open image: {e}")
         return
 
-    img_cropped = mtcnn(img)
+    with inference_context():
+        img_cropped = mtcnn(img)
 
     if img_cropped is None:
         return "No face detected"
 
-    img_embedding = resnet(img_cropped.unsqueeze(0).to(device)).detach()
-
-    dist_list = (embedding_list - img_embedding).norm(dim=1)
+    with inference_context():
+        img_embedding = resnet(img_cropped.unsqueeze(0).to(device)).detach()
 
-    min_dist, min_idx = torch.min(dist_list, dim=0)
+    scores, indices = gallery.search(img_embedding, k=1)
+    min_dist = scores[0, 0].item()
 
     threshold = 0.8
 
-    if min_dist.item() > threshold:
-        return f"Unknown (Distance: {min_dist.item():.2f})"
+    if min_dist > threshold:
+        return f"Unknown (Distance: {min_dist:.2f})"
     else:
-        name = name_list[min_idx]
-        return f"Match: {name} (Confidence: {min_dist.item():.2f})"
+        name = gallery.names[indices[0, 0].item()]
+        return f"Match: {name} (Confidence: {min_dist:.2f})"
 
 
 if __name__ == "__main__":
@@ -1,48 +1,47 @@
+import numpy as np
 import torch
 from PIL import Image
 import io, os
-from facenet_pytorch import MTCNN, InceptionResnetV1
-import torch
-from PIL import Image
-import io, os
-from facenet_pytorch import MTCNN, InceptionResnetV1
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.model_registry import device, get_mtcnn, get_resnet, inference_context
+from utils.gallery_index import GalleryIndex
+from utils.embedding_store import get_store, EMBEDDINGS_STORE_PATH
 
 
-def predict_faces_from_bytes(
-    image_bytes, embedding_list, name_list, mtcnn, resnet, device
-):
+def predict_faces_from_bytes(image_bytes, gallery, mtcnn, resnet, device):
     try:
         img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
     except Exception as e:
         return {"error": f"Invalid image: {e}"}
 
-    faces_cropped, probs = mtcnn(img, return_prob=True)
+    with inference_context():
+        faces_cropped, probs = mtcnn(img, return_prob=True)
 
     if faces_cropped is None:
         return {"status": "no_face_detected", "matches": []}
 
-    results = []
-
-    for i, face_tensor in enumerate(faces_cropped):
+    # One batched forward pass for every face, then one gallery search
+    with inference_context():
+        embs = resnet(faces_cropped.to(device)).detach()
 
-        face_tensor = face_tensor.unsqueeze(0).to(device)
+    scores, indices = gallery.search(embs, k=1)
+    min_dists, min_idxs = scores[:, 0], indices[:, 0]
 
-        emb = resnet(face_tensor).detach()
-        emb = emb / emb.norm()
+    threshold = 0.8
 
-        dist_list = (embedding_list - emb).norm(dim=1)
-
-        min_dist, min_idx = torch.min(dist_list, dim=0)
-        min_dist_val = min_dist.item()
+    results = []
 
-        threshold = 0.8
+    for i, (min_dist_val, min_idx) in enumerate(zip(min_dists.tolist(), min_idxs.tolist())):
 
         if min_dist_val < threshold:
             results.append(
                 {
                     "face_index": i + 1,
                     "status": "Match",
-                    "name": name_list[min_idx],
+                    "name": gallery.names[min_idx],
                     "confidence_score": round(1 - min_dist_val, 4),
                 }
             )
@@ -61,26 +60,25 @@ def predict_faces_from_bytes(
 if __name__ == "__main__":
     image_path = "tushar_yugal.jpg"
 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Running on: {device}")
 
-    mtcnn = MTCNN(keep_all=True, device=device)
-    resnet = InceptionResnetV1(pretrained="vggface2").eval().to(device)
+    mtcnn = get_mtcnn(keep_all=True)
+    resnet = get_resnet()
 
-    if os.path.exists("embaddings.pt"):
-        saved_data = torch.load("embaddings.pt")
-        embedding_list = saved_data[0].to(device)
-        name_list = saved_data[1]
+    store = get_store()
+    if len(store):
+        vectors, ids = store.snapshot()
+        gallery = GalleryIndex(torch.from_numpy(np.array(vectors)), ids, device=device)
 
         if os.path.exists(image_path):
             with open(image_path, "rb") as img_file:
                 image_bytes = img_file.read()
 
             result = predict_faces_from_bytes(
-                image_bytes, embedding_list, name_list, mtcnn, resnet, device
+                image_bytes, gallery, mtcnn, resnet, device
             )
             print(result)
         else:
             print(f"Image {image_path} not found.")
     else:
-        print("embaddings.pt not found.")
+        print(f"No embeddings in {EMBEDDINGS_STORE_PATH}, run build_embeddings.py first.")
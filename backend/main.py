@@ -1,14 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 from routes.students import router as students_router
 import os
 from dotenv import load_dotenv
-from db import engine, Base
+from db import engine, Base, lock_schema, upgrade_schema
 import base64
 from PIL import Image
 import io
-import torch
+from utils import attendance_cache, attendance_rollup, model_loader
 
 
 load_dotenv()
@@ -33,9 +34,22 @@ async def startup_event():
     DATABASE_URL = os.getenv("DATABASE_URL")
     print(f"Images path: {images_path}")
     print(f"Database URL: {DATABASE_URL}")
-    print("Device is working on:", "cuda" if torch.cuda.is_available() else "cpu")
     async with engine.begin() as conn:
+        await lock_schema(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+        await attendance_rollup.backfill_if_empty(conn)
+
+    # Load the face models once per worker in the background, /ready reports
+    # when they are done; MODEL_WARMUP=0 defers it to the first frame
+    if model_loader.MODEL_WARMUP == "1":
+        model_loader.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write attendance rows still waiting for the batch writer
+    await attendance_cache.flush()
 
 
 @app.get("/")
@@ -43,6 +57,12 @@ async def read_root():
     return {"message": "Welcome to the Student Face Recognition API"}
 
 
+@app.get("/ready")
+async def read_ready():
+    status = model_loader.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 def base64_to_image(base64_str):
     try:
         if "base64," in base64_str:
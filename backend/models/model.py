@@ -1,4 +1,4 @@
-from sqlalchemy import Column,Integer,String,DateTime,func,ForeignKey
+from sqlalchemy import Column,Integer,String,DateTime,Date,func,ForeignKey,Index,UniqueConstraint
 from sqlalchemy.orm import relationship
 from db import Base
 
@@ -32,10 +32,37 @@ class Attendance(Base):
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     date = Column(DateTime(timezone=True), server_default=func.now())
+    # Attendance day, stored so day/range filters can use plain indexes
+    day = Column(Date, nullable=False, server_default=func.current_date())
     time_slot = Column(String, nullable=False)
     status = Column(String, default="Present")
+
+    __table_args__ = (
+        UniqueConstraint("student_id", "day", "time_slot", name="uq_attendance_student_day_slot"),
+        Index("ix_attendance_day_slot", "day", "time_slot"),
+        Index("ix_attendance_date", "date"),
+    )
     
     student = relationship("Student", back_populates="attendance")
 
 Student.attendance = relationship("Attendance", back_populates="student")
-    
\ No newline at end of file
+    
+
+
+# Rollups maintained by utils.attendance_rollup. One attendance row exists per
+# student/day/slot, so per-student counts are rolled up by month.
+class AttendanceDaily(Base):
+    __tablename__ = "attendance_daily"
+
+    day = Column(Date, primary_key=True)
+    time_slot = Column(String, primary_key=True)
+    present = Column(Integer, nullable=False, default=0)
+
+
+class AttendanceStudentMonthly(Base):
+    __tablename__ = "attendance_student_monthly"
+
+    month = Column(Date, primary_key=True)
+    time_slot = Column(String, primary_key=True)
+    student_id = Column(Integer, primary_key=True)
+    present = Column(Integer, nullable=False, default=0)
@@ -7,27 +7,41 @@ from fastapi import (
     Depends,
     WebSocket,
     WebSocketDisconnect,
+    Response,
 )
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func, delete, extract, and_
+from sqlalchemy import func, delete, and_, tuple_
 from models.model import Student, StudentImage, Attendance
 from typing import List, Optional
 import os
 import shutil
 import asyncio
-from db import get_session, AsyncSessionLocal
+import time
+from db import get_session, pool_stats
 from dotenv import load_dotenv
 import aiofiles
-from utils.face_utils import update_student_dataset_embaddings
-from controllers.students_pred import base64_to_image, predict_image
-from utils.attendance_utils import get_current_time_slot
-from datetime import date, datetime, timedelta
+import msgpack
+from utils.enrollment_jobs import submit_enrollment, get_job
+from utils.embedding_store import get_store
+from utils import model_loader
+from utils.attendance_utils import period_bounds, encode_cursor, decode_cursor
+from utils.attendance_cache import mark_attendance, get_student, invalidate_roster
+from utils import attendance_rollup, attendance_export, response_cache
+from utils.response_cache import cached
+from utils.attendance_rollup import ROLLUP_PERIODS
+from utils.frame_scheduler import FrameScheduler, parse_fps
+from utils.face_tracker import FaceTracker, FACE_TRACKING
+from datetime import date, datetime
 
 load_dotenv()
 router = APIRouter()
 
 IMAGES_PATH = os.getenv("IMAGES_PATH", "./images")
+# Rows per page for attendance listings (keyset paginated with ?cursor=)
+PAGE_SIZE = int(os.getenv("ATTENDANCE_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = 10000
 
 
 @router.post("/add_students")
@@ -82,25 +96,52 @@ async def get_students(
 
     await session.commit()
     await session.refresh(student, attribute_names=["images"])
+    invalidate_roster()
+    response_cache.invalidate("students", f"student_images:{student.id}")
 
-    try:
-        success = update_student_dataset_embaddings(enrollment_number, saved_file_paths)
-        status_msg = "Embeddings updated." if success else "No embeddings updated."
-        print(status_msg)
-    except Exception as e:
-        print(f"Error updating embeddings: {e}")
-        status_msg = "Failed to update embeddings."
+    # Embedding runs in the background; poll /jobs/{job_id} for the result
+    job = submit_enrollment(enrollment_number, saved_file_paths)
 
     return {
-        "message": f"Student saved. {status_msg}",
+        "message": "Student saved. Embeddings are being updated.",
         "student_id": student.id,
         "enrollment_number": student.enrollment_number,
         "name": student.name,
         "total_images": saved_images,
+        "job_id": job["job_id"],
+        "job_status": job["status"],
     }
 
 
+@router.get("/jobs/{job_id}")
+async def get_enrollment_job(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(404, detail="Job not found")
+    return job
+
+
+@router.get("/inference/metrics")
+async def get_inference_metrics():
+    if not model_loader.is_loaded():
+        return model_loader.status()
+    from utils import inference_service
+
+    return inference_service.get_metrics()
+
+
+@router.get("/cache/metrics")
+async def get_cache_metrics():
+    return response_cache.get_metrics()
+
+
+@router.get("/db/metrics")
+async def get_db_metrics():
+    return pool_stats()
+
+
 @router.get("/all")
+@cached("students")
 async def get_all_students(session: AsyncSession = Depends(get_session)):
     stmt = select(Student).order_by(Student.name)
     result = await session.execute(stmt)
@@ -127,11 +168,19 @@ async def delete_student(student_id: int, session: AsyncSession = Depends(get_se
     # But for now let's try deleting the student directly
     await session.delete(student)
     await session.commit()
+    invalidate_roster()
+    response_cache.invalidate("students", "attendance", f"student_images:{student_id}")
+
+    # The store needs no models; every worker's gallery drops the row on its
+    # next search when it sees the store's version change
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, lambda: get_store().delete(student.enrollment_number))
     
     return {"message": "Student deleted successfully"}
 
 
 @router.get("/stats")
+@cached("students", "attendance")
 async def get_stats(session: AsyncSession = Depends(get_session)):
     # Total Students
     stmt_students = select(func.count(Student.id))
@@ -140,7 +189,7 @@ async def get_stats(session: AsyncSession = Depends(get_session)):
     
     # Today's Attendance
     today = date.today()
-    stmt_attendance = select(func.count(Attendance.id)).where(func.date(Attendance.date) == today)
+    stmt_attendance = select(func.count(Attendance.id)).where(Attendance.day == today)
     result_attendance = await session.execute(stmt_attendance)
     today_attendance = result_attendance.scalar()
     
@@ -150,72 +199,142 @@ async def get_stats(session: AsyncSession = Depends(get_session)):
     }
 
 
+def parse_target_date(date_str: Optional[str]):
+    if not date_str:
+        return date.today()
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(400, detail="Invalid date format. Use YYYY-MM-DD")
+
+
+def attendance_filters(period: str, slot: Optional[str], target_date: date):
+    filters = []
+    if slot and slot != "All":
+        filters.append(Attendance.time_slot == slot)
+
+    # Range predicates on the stored day so (day, time_slot) is usable
+    bounds = period_bounds(period, target_date)
+    if bounds:
+        filters.extend([Attendance.day >= bounds[0], Attendance.day < bounds[1]])
+    return filters
+
+
+async def attendance_page(session: AsyncSession, filters, limit: Optional[int], cursor: Optional[str]):
+    # Keyset pagination over (date desc, id desc); only the listed columns are
+    # selected, no ORM entities are built. Paging is opt-in: without limit and
+    # cursor every matching row is returned, as callers always got.
+    if limit is not None or cursor is not None:
+        limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+    stmt = (
+        select(
+            Attendance.id,
+            Attendance.date,
+            Attendance.time_slot,
+            Attendance.status,
+            Student.name,
+            Student.enrollment_number,
+        )
+        .join(Student, Student.id == Attendance.student_id)
+        .where(*filters)
+        .order_by(Attendance.date.desc(), Attendance.id.desc())
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_cursor(cursor)
+        except Exception:
+            raise HTTPException(400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(Attendance.date, Attendance.id) < tuple_(cursor_date, cursor_id))
+
+    rows = (await session.execute(stmt)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows, next_cursor
+
+
 @router.get("/attendance")
-async def get_attendance(session: AsyncSession = Depends(get_session)):
-    stmt = select(Attendance, Student).join(Student).order_by(Attendance.date.desc())
-    result = await session.execute(stmt)
-    records = result.all()
-    
+async def get_attendance(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    rows, next_cursor = await attendance_page(session, [], limit, cursor)
+    # The body stays a plain list; the next page is requested with ?cursor=
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
     return [
         {
-            "id": record.Attendance.id,
-            "student_name": record.Student.name,
-            "enrollment_number": record.Student.enrollment_number,
-            "date": record.Attendance.date,
-            "time_slot": record.Attendance.time_slot,
-            "status": record.Attendance.status
+            "id": row.id,
+            "student_name": row.name,
+            "enrollment_number": row.enrollment_number,
+            "date": row.date,
+            "time_slot": row.time_slot,
+            "status": row.status
         }
-        for record in records
+        for row in rows
     ]
 
 
 @router.get("/attendance/today")
+@cached("students", "attendance")
 async def get_today_attendance(session: AsyncSession = Depends(get_session)):
     today = date.today()
-    stmt = select(Attendance, Student).join(Student).where(func.date(Attendance.date) == today).order_by(Attendance.date.desc())
+    stmt = (
+        select(Attendance.date, Attendance.time_slot, Attendance.status, Student.name, Student.enrollment_number)
+        .join(Student, Student.id == Attendance.student_id)
+        .where(Attendance.day == today)
+        .order_by(Attendance.date.desc())
+    )
     result = await session.execute(stmt)
-    records = result.all()
+    rows = result.all()
     
     return [
         {
-            "student_name": record.Student.name,
-            "enrollment_number": record.Student.enrollment_number,
-            "time_slot": record.Attendance.time_slot,
-            "status": record.Attendance.status,
-            "enter_time": record.Attendance.date.strftime("%I:%M %p")
+            "student_name": row.name,
+            "enrollment_number": row.enrollment_number,
+            "time_slot": row.time_slot,
+            "status": row.status,
+            "enter_time": row.date.strftime("%I:%M %p")
         }
-        for record in records
+        for row in rows
     ]
 
 
-async def mark_attendance(enrollment_number: str):
-    slot = get_current_time_slot()
-    if not slot:
-        return "No active time slot"
-
-    async with AsyncSessionLocal() as session:
-        stmt = select(Student).where(Student.enrollment_number == enrollment_number)
-        result = await session.execute(stmt)
-        student = result.scalars().first()
-        
-        if not student:
-            return "Student not found"
-
-        stmt = select(Attendance).where(
-            Attendance.student_id == student.id,
-            Attendance.time_slot == slot,
-            func.date(Attendance.date) == date.today()
+@router.get("/attendance/export")
+async def export_attendance(
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    slot: Optional[str] = None,
+    enrollment_number: Optional[str] = None,
+):
+    # Streams attendance joined with students for [start, end] (inclusive days)
+    start_date = parse_target_date(start) if start else None
+    end_date = parse_target_date(end) if end else None
+    stmt = attendance_export.export_query(start_date, end_date, slot, enrollment_number)
+
+    filename = f"attendance_{start or 'all'}_{end or 'all'}"
+    if format == "csv":
+        return StreamingResponse(
+            attendance_export.stream_csv(stmt),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
         )
-        result = await session.execute(stmt)
-        attendance = result.scalars().first()
-        
-        if attendance:
-            return f"Attendance already marked for {slot}"
-            
-        new_attendance = Attendance(student_id=student.id, time_slot=slot, status="Present")
-        session.add(new_attendance)
-        await session.commit()
-        return f"Attendance marked for {slot}"
+    if format == "parquet":
+        if not attendance_export.parquet_available():
+            raise HTTPException(400, detail="Parquet export requires pyarrow to be installed")
+        return StreamingResponse(
+            attendance_export.stream_parquet(stmt),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.parquet"'},
+        )
+    raise HTTPException(400, detail="Unsupported format. Use csv or parquet")
 
 
 @router.get("/analytics")
@@ -223,98 +342,276 @@ async def get_analytics(
     period: str = "day",
     slot: Optional[str] = None,
     date_str: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     session: AsyncSession = Depends(get_session)
 ):
+    target_date = parse_target_date(date_str)
     try:
-        if date_str:
-            try:
-                target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError:
-                raise HTTPException(400, detail="Invalid date format. Use YYYY-MM-DD")
-        else:
-            target_date = date.today()
+        filters = attendance_filters(period, slot, target_date)
+        rows, next_cursor = await attendance_page(session, filters, limit, cursor)
+        count = len(rows)
+        if limit is not None or cursor is not None:
+            # count stays the total of the period, not the size of the page
+            count = (await session.execute(
+                select(func.count(Attendance.id)).where(*filters)
+            )).scalar()
+
+        data = [
+            {
+                "id": row.id,
+                "student_name": row.name,
+                "enrollment_number": row.enrollment_number,
+                "date": row.date.isoformat(),
+                "time_slot": row.time_slot,
+                "status": row.status
+            }
+            for row in rows
+        ]
+
+        return {
+            "data": data,
+            "count": count,
+            "next_cursor": next_cursor,
+            "period": period,
+            "target_date": target_date.isoformat(),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_analytics: {e}")
+        raise HTTPException(500, detail=str(e))
 
-        # Use implicit join based on ForeignKey
-        query = select(Attendance, Student).join(Student)
-        
-        if slot and slot != "All":
-            query = query.where(Attendance.time_slot == slot)
-
-        if period == "day":
-            query = query.where(func.date(Attendance.date) == target_date)
-        elif period == "week":
-            start_of_week = target_date - timedelta(days=target_date.weekday())
-            end_of_week = start_of_week + timedelta(days=6)
-            query = query.where(func.date(Attendance.date) >= start_of_week, func.date(Attendance.date) <= end_of_week)
-        elif period == "month":
-            query = query.where(extract('year', Attendance.date) == target_date.year, extract('month', Attendance.date) == target_date.month)
-        elif period == "year":
-            query = query.where(extract('year', Attendance.date) == target_date.year)
-            
-        query = query.order_by(Attendance.date.desc())
-            
-        result = await session.execute(query)
-        rows = result.all()
-        
-        data = []
-        for att, stu in rows:
-            data.append({
-                "id": att.id,
-                "student_name": stu.name,
-                "enrollment_number": stu.enrollment_number,
-                "date": att.date.isoformat(),
-                "time_slot": att.time_slot,
-                "status": att.status
-            })
 
-        return {"data": data, "count": len(data), "period": period, "target_date": target_date.isoformat()}
+@router.get("/analytics/summary")
+async def get_analytics_summary(
+    period: str = "day",
+    slot: Optional[str] = None,
+    date_str: Optional[str] = None,
+    session: AsyncSession = Depends(get_session)
+):
+    # Counts computed in SQL: per day, per slot and per student, with
+    # attendance rates against the sessions (day, slot pairs) held.
+    # Week/month/year read the rollup tables instead of raw attendance.
+    target_date = parse_target_date(date_str)
+    try:
+        bounds = period_bounds(period, target_date)
+        if period in ROLLUP_PERIODS and bounds:
+            per_day, per_slot, sessions, per_student = await attendance_rollup.summary(
+                session, bounds, slot if slot and slot != "All" else None
+            )
+        else:
+            per_day, per_slot, sessions, per_student = await raw_summary(
+                session, attendance_filters(period, slot, target_date)
+            )
+
+        students = [
+            {
+                "student_id": student_id,
+                "enrollment_number": enrollment_number,
+                "student_name": name,
+                "present": present,
+                "rate": round(present / sessions, 4) if sessions else 0,
+            }
+            for student_id, enrollment_number, name, present in per_student
+        ]
+        total = sum(student["present"] for student in students)
+
+        return {
+            "period": period,
+            "target_date": target_date.isoformat(),
+            "total": total,
+            "sessions": sessions,
+            "students": len(students),
+            "rate": round(total / (sessions * len(students)), 4) if sessions and students else 0,
+            "per_day": [{"day": day.isoformat(), "count": count} for day, count in per_day],
+            "per_slot": [{"time_slot": time_slot, "count": count} for time_slot, count in per_slot],
+            "per_student": students,
+        }
     except Exception as e:
-        print(f"Error in get_analytics: {e}")
+        print(f"Error in get_analytics_summary: {e}")
         raise HTTPException(500, detail=str(e))
 
 
+async def raw_summary(session: AsyncSession, filters):
+    per_day = await session.execute(
+        select(Attendance.day, func.count(Attendance.id))
+        .where(*filters)
+        .group_by(Attendance.day)
+        .order_by(Attendance.day)
+    )
+    per_slot = await session.execute(
+        select(Attendance.time_slot, func.count(Attendance.id))
+        .where(*filters)
+        .group_by(Attendance.time_slot)
+        .order_by(Attendance.time_slot)
+    )
+    sessions_held = await session.execute(
+        select(func.count()).select_from(
+            select(Attendance.day, Attendance.time_slot).where(*filters).distinct().subquery()
+        )
+    )
+    # Outer join keeps students without any mark in the period
+    per_student = await session.execute(
+        select(Student.id, Student.enrollment_number, Student.name, func.count(Attendance.id))
+        .outerjoin(Attendance, and_(Attendance.student_id == Student.id, *filters))
+        .group_by(Student.id, Student.enrollment_number, Student.name)
+        .order_by(Student.name)
+    )
+    return per_day.all(), per_slot.all(), sessions_held.scalar() or 0, per_student.all()
+
+
+async def describe_face(enrollment_number: str):
+    attendance_msg = ""
+    student_name = ""
+
+    if enrollment_number != "Unknown" and enrollment_number != "error" and enrollment_number != "no face":
+        # Both come from the in-process roster; no database round-trip per frame
+        attendance_msg = await mark_attendance(enrollment_number)
+
+        student = await get_student(enrollment_number)
+        if student:
+            student_name = student[1]
+
+    return attendance_msg, student_name
+
+
+async def face_reply(enrollment_number, distance, message, box):
+    attendance_msg, student_name = await describe_face(enrollment_number)
+    return {
+        "enrollment_number": enrollment_number,
+        "distance": distance,
+        "message": message,
+        "attendance": attendance_msg,
+        "student_name": student_name,
+        "box": box,
+    }
+
+
+async def send_reply(websocket: WebSocket, reply_format: str, payload: dict):
+    if reply_format == "msgpack":
+        await websocket.send_bytes(msgpack.packb(payload))
+    elif reply_format == "json":
+        await websocket.send_json(payload)
+    else:
+        # Legacy comma-joined reply for single-face text clients
+        box = payload["box"]
+        box_str = f"{box[0]},{box[1]},{box[2]},{box[3]}" if box else "null"
+        await websocket.send_text(
+            f"{payload['enrollment_number']},{payload['distance']},{payload['message']},"
+            f"{payload['attendance']},{payload['student_name']},{box_str}"
+        )
+
+
+async def read_frames(websocket: WebSocket, scheduler: FrameScheduler):
+    # Drain the socket as fast as frames arrive so nothing queues up in it;
+    # the scheduler keeps only the newest frame.
+    try:
+        while True:
+            data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                break
+            scheduler.put(data)
+    finally:
+        scheduler.close()
+
+
 @router.websocket("/ws/face_recognition")
 async def websocket_face_recognition(websocket: WebSocket):
     print("WebSocket connection requested")
     await websocket.accept()
-    frame_count = 0
-    loop = asyncio.get_event_loop()
+    # Frames wait for a worker that is still loading its models
+    await model_loader.load_models()
+    from controllers.students_pred import base64_to_image, bytes_to_image
+    from utils import inference_service
+    from utils.frame_gate import FrameGate, FRAME_GATING, NO_FACE
+    from utils.detection_profiles import RegionTracker, ROI_TRACKING, get_profile
+
+    # mode=multi recognizes every face in the frame
+    multi_face = websocket.query_params.get("mode") == "multi"
+    # reply=json|msgpack sends structured replies; text keeps the old format
+    reply_format = websocket.query_params.get("reply", "json" if multi_face else "text")
+    if multi_face and reply_format == "text":
+        reply_format = "json"
+    # fps caps how often this connection runs inference; slower inference lowers it further
+    scheduler = FrameScheduler(parse_fps(websocket.query_params.get("fps")))
+    # track=0 runs recognition on every face of every processed frame
+    tracker = FaceTracker() if websocket.query_params.get("track", FACE_TRACKING) == "1" else None
+    # gate=0 sends every frame through detection, even unchanged or empty ones
+    gate = FrameGate() if websocket.query_params.get("gate", FRAME_GATING) == "1" else None
+    # profile=<name> picks the camera's detection settings (min face size, pyramid, region)
+    profile = get_profile(websocket.query_params.get("profile"))
+    # roi=0 always searches the profile's full region instead of following the faces
+    region = RegionTracker(profile) if websocket.query_params.get("roi", ROI_TRACKING) == "1" else None
+
+    async def recognize(image):
+        if gate is not None:
+            previous = gate.check(image)
+            if previous is not None:
+                return previous
+            if gate.presence_check and not await inference_service.face_present(image, profile):
+                gate.empty_frame()
+                result = [NO_FACE] if multi_face else NO_FACE
+                gate.processed(result)
+                return result
+
+        # Batched with the frames of other connections off the event loop
+        started = time.perf_counter()
+        roi = region.next_roi() if region is not None else None
+        if tracker is not None:
+            result = await inference_service.predict_tracked(tracker, image, multi_face, profile, roi)
+        else:
+            result = await inference_service.predict(image, multi_face, profile, roi)
+        scheduler.record(time.perf_counter() - started)
+        if region is not None:
+            region.update([face[3] for face in (result if multi_face else [result])], image.size)
+        if gate is not None:
+            gate.processed(result)
+        return result
+
+    def connection_stats():
+        stats = scheduler.stats()
+        stats["profile"] = profile.name
+        if tracker is not None:
+            stats.update(tracker.stats())
+        if gate is not None:
+            stats.update(gate.stats())
+        if region is not None:
+            stats.update(region.stats())
+        return stats
+
+    reader = asyncio.create_task(read_frames(websocket, scheduler))
     try:
         while True:
-            data = await websocket.receive_text()
-            frame_count += 1
+            # Frames are either raw JPEG bytes (binary) or base64 data URLs (text)
+            data = await scheduler.get()
+            if data is None:
+                break
+
+            # Only the frame that is about to be processed gets decoded
+            if data.get("bytes") is not None:
+                pil_image = bytes_to_image(data["bytes"])
+            else:
+                pil_image = base64_to_image(data.get("text") or "")
             
-            # Process every 3rd frame to reduce CPU load
-            if frame_count % 3 != 0:
-                continue
 
-            pil_image = base64_to_image(data)
-            
+            if pil_image and multi_face:
+                predictions = await recognize(pil_image)
 
-            if pil_image:
-                # Run in executor to avoid blocking
-                enrollment_number, distance, message, box = await loop.run_in_executor(None, predict_image, pil_image)
-                
-                attendance_msg = ""
-                student_name = ""
-
-                if enrollment_number != "Unknown" and enrollment_number != "error" and enrollment_number != "no face":
-                    attendance_msg = await mark_attendance(enrollment_number)
-                    
-                    async with AsyncSessionLocal() as session:
-                        stmt = select(Student).where(Student.enrollment_number == enrollment_number)
-                        result = await session.execute(stmt)
-                        student = result.scalars().first()
-                        if student:
-                            student_name = student.name
-                
-                # Format box as string "x1,y1,x2,y2" or "null"
-                box_str = f"{box[0]},{box[1]},{box[2]},{box[3]}" if box else "null"
-
-                await websocket.send_text(f"{enrollment_number},{distance},{message},{attendance_msg},{student_name},{box_str}")
-            else:
+                faces = [await face_reply(*prediction) for prediction in predictions]
+                await send_reply(websocket, reply_format, {"faces": faces, "stats": connection_stats()})
+            elif pil_image:
+                prediction = await recognize(pil_image)
+
+                reply = await face_reply(*prediction)
+                reply["stats"] = connection_stats()
+                await send_reply(websocket, reply_format, reply)
+            elif reply_format == "text":
                 await websocket.send_text("Error,Invalid image data")
+            else:
+                await send_reply(websocket, reply_format, {"error": "Invalid image data"})
 
+        print(f"WebSocket disconnected ({connection_stats()})")
     except WebSocketDisconnect:
         print(f"WebSocket disconnected")
     except Exception as e:
@@ -323,9 +620,12 @@ async def websocket_face_recognition(websocket: WebSocket):
             await websocket.close()
         except:
             pass
+    finally:
+        reader.cancel()
 
 
 @router.get("/{id}/images")
+@cached("student_images:{id}")
 async def get_student_images(id: int, session: AsyncSession = Depends(get_session)):
     stmt = select(Student).where(Student.id == id)
     result = await session.execute(stmt)
@@ -367,6 +667,7 @@ async def delete_student_image(id: int, filename: str, session: AsyncSession = D
         stmt = delete(StudentImage).where(StudentImage.file_path == file_path)
         await session.execute(stmt)
         await session.commit()
+        response_cache.invalidate(f"student_images:{id}")
         
         return {"message": "Image deleted"}
     else:
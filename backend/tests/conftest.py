@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend modules are imported from the backend directory, as uvicorn does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,142 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils import embedding_store
+from utils.embedding_store import EmbeddingStore, _encode
+
+
+def vec(i):
+    return np.random.default_rng(i).standard_normal(512).astype(np.float32)
+
+
+def open_store(root):
+    # A small capacity so a few upserts grow the vectors file
+    return EmbeddingStore(root, initial_capacity=2)
+
+
+def assert_holds(store, expected):
+    assert set(store.rows) == set(expected)
+    for id_, vector in expected.items():
+        np.testing.assert_array_equal(store.vectors[store.rows[id_]], vector)
+
+
+def test_reopen_replays_the_wal(tmp_path):
+    store = open_store(tmp_path)
+    for i in range(5):
+        store.upsert(f"S{i}", vec(i))
+    store.upsert("S1", vec(10))
+    store.delete("S3")
+
+    reopened = open_store(tmp_path)
+    assert reopened.ids == store.ids
+    assert_holds(reopened, {"S0": vec(0), "S1": vec(10), "S2": vec(2), "S4": vec(4)})
+
+
+def test_replay_writes_vectors_the_crash_lost(tmp_path):
+    store = open_store(tmp_path)
+    store.upsert("S0", vec(0))
+    # Logged, then the process died before the row was written
+    with open(store._wal_path(store.generation), "a") as f:
+        f.write(json.dumps({"op": "upsert", "id": "S1", "vector": _encode(vec(1))}) + "\n")
+
+    assert_holds(open_store(tmp_path), {"S0": vec(0), "S1": vec(1)})
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    store = open_store(tmp_path)
+    store.upsert("S0", vec(0))
+    wal_path = store._wal_path(store.generation)
+    complete = wal_path.stat().st_size
+    with open(wal_path, "a") as f:
+        f.write(json.dumps({"op": "upsert", "id": "S1", "vector": _encode(vec(1))})[:100])
+
+    reopened = open_store(tmp_path)
+    assert_holds(reopened, {"S0": vec(0)})
+    assert wal_path.stat().st_size == complete
+
+    # The log stays appendable after the repair
+    reopened.upsert("S2", vec(2))
+    assert_holds(open_store(tmp_path), {"S0": vec(0), "S2": vec(2)})
+
+
+def test_checkpoint_starts_a_new_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_store, "CHECKPOINT_EVERY", 3)
+    store = open_store(tmp_path)
+    for i in range(3):
+        store.upsert(f"S{i}", vec(i))
+
+    assert store.generation == 1
+    assert store.vectors_file == "vectors.0.f32"
+    assert not store._wal_path(0).exists()
+    assert store._wal_path(1).stat().st_size == 0
+
+    store.upsert("S3", vec(3))
+    assert_holds(open_store(tmp_path), {f"S{i}": vec(i) for i in range(4)})
+
+
+def test_checkpoint_compacts_retired_rows(tmp_path):
+    store = open_store(tmp_path)
+    for i in range(4):
+        store.upsert(f"S{i}", vec(i))
+    store.delete("S1")
+    store.upsert("S2", vec(20))
+    assert store.ids == ["S0", None, None, "S3", "S2"]
+
+    store.checkpoint()
+    assert store.ids == ["S0", "S3", "S2"]
+    assert store.vectors_file == "vectors.1.f32"
+    assert not (tmp_path / "vectors.0.f32").exists()
+    expected = {"S0": vec(0), "S2": vec(20), "S3": vec(3)}
+    assert_holds(store, expected)
+    assert_holds(open_store(tmp_path), expected)
+
+
+def test_snapshot_rows_are_never_rewritten(tmp_path):
+    store = open_store(tmp_path)
+    for i in range(4):
+        store.upsert(f"S{i}", vec(i))
+    vectors, ids = store.snapshot()
+    before = np.array(vectors)
+
+    # A gallery built from the snapshot keeps searching it meanwhile
+    store.delete("S0")
+    store.upsert("S1", vec(11))
+    store.upsert("S4", vec(4))
+    np.testing.assert_array_equal(vectors, before)
+
+    vectors, ids = store.snapshot()
+    assert ids == [None, None, "S2", "S3", "S1", "S4"]
+    np.testing.assert_array_equal(vectors[:4], before)
+    assert_holds(store, {"S1": vec(11), "S2": vec(2), "S3": vec(3), "S4": vec(4)})
+
+
+def test_refresh_sees_other_instances(tmp_path):
+    writer, reader = open_store(tmp_path), open_store(tmp_path)
+    assert not reader.refresh()
+
+    for i in range(3):
+        writer.upsert(f"S{i}", vec(i))
+    writer.delete("S0")
+    assert reader.refresh()
+    assert reader.version == writer.version
+    assert_holds(reader, {"S1": vec(1), "S2": vec(2)})
+    assert not reader.refresh()
+
+    writer.checkpoint()
+    writer.upsert("S3", vec(3))
+    assert reader.refresh()
+    assert reader.generation == writer.generation
+    assert_holds(reader, {"S1": vec(1), "S2": vec(2), "S3": vec(3)})
+
+    writer.replace_all(np.stack([vec(7)]), ["S7"])
+    assert reader.refresh()
+    assert reader.vectors_file == writer.vectors_file
+    assert_holds(reader, {"S7": vec(7)})
+
+
+def test_replace_all_rejects_duplicate_ids(tmp_path):
+    store = open_store(tmp_path)
+    with pytest.raises(ValueError):
+        store.replace_all(np.stack([vec(0), vec(1)]), ["S0", "S0"])
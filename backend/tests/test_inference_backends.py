@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+import torch
+from PIL import Image, ImageEnhance
+
+from utils.gallery_index import GalleryIndex
+from utils.inference_backends import BACKENDS, EMBEDDING_PARITY_TOL, EagerBackend
+from utils.model_registry import get_mtcnn, get_resnet
+
+# NASA portrait of Eileen Collins (public domain), the scikit-image astronaut sample
+SAMPLE_IMAGE = Path(__file__).parent / "data" / "astronaut.jpg"
+
+
+def variants(image):
+    # Views of the sample that MTCNN aligns into different crops
+    yield image
+    yield image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    yield image.rotate(10, resample=Image.Resampling.BILINEAR)
+    yield image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.Resampling.BILINEAR)
+    yield ImageEnhance.Brightness(image).enhance(0.7)
+    yield ImageEnhance.Contrast(image).enhance(1.4)
+
+
+@pytest.fixture(scope="module")
+def faces():
+    # Aligned, standardized 3x160x160 crops as the live path produces them
+    mtcnn = get_mtcnn()
+    crops = [mtcnn(view) for view in variants(Image.open(SAMPLE_IMAGE).convert("RGB"))]
+    assert all(crop is not None for crop in crops), "MTCNN found no face in the sample image"
+    return torch.stack(crops)
+
+
+@pytest.fixture(scope="module")
+def expected(faces):
+    return EagerBackend(get_resnet())(faces).float().cpu()
+
+
+def build_backend(name, tmp_path):
+    if name == "onnx":
+        pytest.importorskip("onnxruntime")
+        return BACKENDS[name](get_resnet(), path=tmp_path / "inception_resnet_v1.onnx")
+    return BACKENDS[name](get_resnet())
+
+
+@pytest.mark.parametrize("name", ["torchscript", "compile", "onnx"])
+def test_backend_matches_eager(name, faces, expected, tmp_path):
+    actual = build_backend(name, tmp_path)(faces).float().cpu()
+
+    assert actual.shape == expected.shape
+    diff = (expected - actual).abs().max().item()
+    assert diff <= EMBEDDING_PARITY_TOL, f"{name} differs from eager by {diff:.2e}"
+
+    # Every crop is still identified as itself against the eager gallery
+    names = [f"view-{i}" for i in range(len(expected))]
+    scores, indices = GalleryIndex(expected, names).search(actual, k=1)
+    assert [names[i] for i in indices[:, 0].tolist()] == names
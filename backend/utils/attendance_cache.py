@@ -0,0 +1,150 @@
+import asyncio
+import os
+from datetime import date, datetime
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from db import AsyncSessionLocal
+from models.model import Student, Attendance
+from utils.attendance_utils import get_current_time_slot
+from utils.attendance_rollup import apply_marks
+from utils import response_cache
+
+# Recognized faces are marked without a database round-trip per frame:
+#   roster   enrollment_number -> (student id, name), loaded once and
+#            invalidated whenever students are added or deleted
+#   marked   (student id, slot) pairs already marked today
+#   writer   background task flushing new attendance rows in one multi-row
+#            INSERT ... ON CONFLICT DO NOTHING, plus the rollup increments
+
+ATTENDANCE_FLUSH_MS = float(os.getenv("ATTENDANCE_FLUSH_MS", "500"))
+ATTENDANCE_MAX_BATCH = int(os.getenv("ATTENDANCE_MAX_BATCH", "500"))
+
+_roster = None
+_roster_lock = asyncio.Lock()
+
+_marked = set()
+_marked_day = None
+
+_pending = []
+_wakeup = None
+_writer_loop = None
+_writer_task = None
+
+
+async def _load_roster():
+    global _roster
+    async with _roster_lock:
+        if _roster is None:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(select(Student.enrollment_number, Student.id, Student.name))
+                _roster = {enrollment: (id_, name) for enrollment, id_, name in result.all()}
+    return _roster
+
+
+async def get_student(enrollment_number: str):
+    # (id, name) of the student, or None
+    roster = _roster if _roster is not None else await _load_roster()
+    student = roster.get(enrollment_number)
+    if student is None:
+        # Possibly enrolled through another worker process since the roster was loaded
+        async with AsyncSessionLocal() as session:
+            stmt = select(Student.id, Student.name).where(Student.enrollment_number == enrollment_number)
+            row = (await session.execute(stmt)).first()
+        if row is not None:
+            student = (row.id, row.name)
+            roster[enrollment_number] = student
+    return student
+
+
+def invalidate_roster():
+    global _roster
+    _roster = None
+
+
+async def _load_marked(today):
+    global _marked, _marked_day
+    async with AsyncSessionLocal() as session:
+        stmt = select(Attendance.student_id, Attendance.time_slot).where(Attendance.day == today)
+        result = await session.execute(stmt)
+        marked = {(student_id, slot) for student_id, slot in result.all()}
+    if _marked_day != today:
+        _marked = marked
+        _marked_day = today
+
+
+async def mark_attendance(enrollment_number: str):
+    slot = get_current_time_slot()
+    if not slot:
+        return "No active time slot"
+
+    student = await get_student(enrollment_number)
+    if not student:
+        return "Student not found"
+
+    today = date.today()
+    if _marked_day != today:
+        await _load_marked(today)
+
+    key = (student[0], slot)
+    if key in _marked:
+        return f"Attendance already marked for {slot}"
+
+    _marked.add(key)
+    _pending.append({
+        "student_id": student[0],
+        "time_slot": slot,
+        "status": "Present",
+        "date": datetime.now().astimezone(),
+        "day": today,
+    })
+    _ensure_writer()
+    if len(_pending) >= ATTENDANCE_MAX_BATCH:
+        _wakeup.set()
+    return f"Attendance marked for {slot}"
+
+
+def _ensure_writer():
+    global _wakeup, _writer_loop, _writer_task
+    loop = asyncio.get_running_loop()
+    if _writer_loop is not loop or _writer_task.done():
+        _writer_loop = loop
+        _wakeup = asyncio.Event()
+        _writer_task = asyncio.create_task(_writer())
+    if _pending:
+        _wakeup.set()
+
+
+async def _writer():
+    while True:
+        await _wakeup.wait()
+        # Let the sightings of the next few hundred ms share one INSERT
+        if len(_pending) < ATTENDANCE_MAX_BATCH:
+            await asyncio.sleep(ATTENDANCE_FLUSH_MS / 1000)
+        _wakeup.clear()
+        await flush()
+
+
+async def flush():
+    global _pending
+    rows, _pending = _pending, []
+    for start in range(0, len(rows), ATTENDANCE_MAX_BATCH):
+        batch = rows[start:start + ATTENDANCE_MAX_BATCH]
+        try:
+            async with AsyncSessionLocal() as session:
+                stmt = (
+                    insert(Attendance)
+                    .values(batch)
+                    .on_conflict_do_nothing()
+                    .returning(Attendance.student_id, Attendance.day, Attendance.time_slot)
+                )
+                inserted = (await session.execute(stmt)).all()
+                # Only rows that were really new count towards the rollups
+                await apply_marks(session, inserted)
+                await session.commit()
+            if inserted:
+                response_cache.invalidate("attendance")
+        except Exception as e:
+            print(f"Failed to write {len(batch)} attendance rows: {e}")
+            # Let the next sighting try again
+            for row in batch:
+                _marked.discard((row["student_id"], row["time_slot"]))
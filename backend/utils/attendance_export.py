@@ -0,0 +1,128 @@
+import csv
+import io
+import os
+from sqlalchemy.future import select
+from db import AsyncSessionLocal
+from models.model import Student, Attendance
+
+# Attendance exports are streamed: rows come from a server-side cursor in
+# chunks of EXPORT_CHUNK_ROWS and each chunk is encoded and sent before the
+# next one is fetched, so memory stays flat whatever the date range.
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+COLUMNS = ("date", "day", "time_slot", "status", "enrollment_number", "student_name")
+
+
+def export_query(start=None, end=None, slot=None, enrollment_number=None):
+    # start/end are inclusive days
+    stmt = (
+        select(
+            Attendance.date,
+            Attendance.day,
+            Attendance.time_slot,
+            Attendance.status,
+            Student.enrollment_number,
+            Student.name,
+        )
+        .join(Student, Student.id == Attendance.student_id)
+        .order_by(Attendance.day, Attendance.date, Attendance.id)
+    )
+    if start:
+        stmt = stmt.where(Attendance.day >= start)
+    if end:
+        stmt = stmt.where(Attendance.day <= end)
+    if slot and slot != "All":
+        stmt = stmt.where(Attendance.time_slot == slot)
+    if enrollment_number:
+        stmt = stmt.where(Student.enrollment_number == enrollment_number)
+    return stmt
+
+
+async def _chunks(stmt):
+    # The session lives inside the generator: it has to outlast the request
+    # handler, which returns as soon as the StreamingResponse is created.
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        async for rows in result.partitions():
+            yield rows
+
+
+async def stream_csv(stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for rows in _chunks(stmt):
+        writer.writerows(
+            (row.date.isoformat(), row.day.isoformat(), row.time_slot, row.status, row.enrollment_number, row.name)
+            for row in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    # Minimal writable file for ParquetWriter; bytes are drained after every row group
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+async def stream_parquet(stmt):
+    # pyarrow is optional; the route checks parquet_available() first
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("date", pa.timestamp("us", tz="UTC")),
+        ("day", pa.date32()),
+        ("time_slot", pa.string()),
+        ("status", pa.string()),
+        ("enrollment_number", pa.string()),
+        ("student_name", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in _chunks(stmt):
+            # One row group per fetched chunk
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
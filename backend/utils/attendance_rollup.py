@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+from collections import Counter
+from datetime import date, datetime
+from sqlalchemy import func, delete
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from db import engine, Base, lock_schema
+from models.model import Student, Attendance, AttendanceDaily, AttendanceStudentMonthly
+
+# Pre-aggregated attendance for week/month/year dashboards:
+#   attendance_daily            (day, time_slot) -> present
+#   attendance_student_monthly  (month, time_slot, student_id) -> present
+# Both are bumped in the same transaction that inserts new attendance rows
+# and can be rebuilt from the raw table at any time:
+#   python -m utils.attendance_rollup [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+
+ROLLUP_PERIODS = ("week", "month", "year")
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+async def apply_marks(session, marks):
+    # marks: (student_id, day, time_slot) of attendance rows actually inserted
+    if not marks:
+        return
+
+    daily = Counter((day, slot) for _, day, slot in marks)
+    monthly = Counter((month_start(day), slot, student_id) for student_id, day, slot in marks)
+
+    stmt = insert(AttendanceDaily).values(
+        [{"day": day, "time_slot": slot, "present": present} for (day, slot), present in daily.items()]
+    )
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[AttendanceDaily.day, AttendanceDaily.time_slot],
+        set_={"present": AttendanceDaily.present + stmt.excluded.present},
+    ))
+
+    stmt = insert(AttendanceStudentMonthly).values([
+        {"month": month, "time_slot": slot, "student_id": student_id, "present": present}
+        for (month, slot, student_id), present in monthly.items()
+    ])
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[
+            AttendanceStudentMonthly.month,
+            AttendanceStudentMonthly.time_slot,
+            AttendanceStudentMonthly.student_id,
+        ],
+        set_={"present": AttendanceStudentMonthly.present + stmt.excluded.present},
+    ))
+
+
+async def rebuild(conn, start=None, end=None):
+    # Recompute the rollups from attendance for the whole months covering
+    # [start, end), or for everything when no range is given
+    daily_filters, monthly_filters, raw_filters = [], [], []
+    if start is not None:
+        start = month_start(start)
+        daily_filters.append(AttendanceDaily.day >= start)
+        monthly_filters.append(AttendanceStudentMonthly.month >= start)
+        raw_filters.append(Attendance.day >= start)
+    if end is not None:
+        end = end if end.day == 1 else next_month(end)
+        daily_filters.append(AttendanceDaily.day < end)
+        monthly_filters.append(AttendanceStudentMonthly.month < end)
+        raw_filters.append(Attendance.day < end)
+
+    await conn.execute(delete(AttendanceDaily).where(*daily_filters))
+    await conn.execute(delete(AttendanceStudentMonthly).where(*monthly_filters))
+
+    await conn.execute(AttendanceDaily.__table__.insert().from_select(
+        ["day", "time_slot", "present"],
+        select(Attendance.day, Attendance.time_slot, func.count())
+        .where(*raw_filters)
+        .group_by(Attendance.day, Attendance.time_slot),
+    ))
+
+    month = func.date_trunc("month", Attendance.day).cast(AttendanceStudentMonthly.month.type)
+    await conn.execute(AttendanceStudentMonthly.__table__.insert().from_select(
+        ["month", "time_slot", "student_id", "present"],
+        select(month, Attendance.time_slot, Attendance.student_id, func.count())
+        .where(*raw_filters)
+        .group_by(month, Attendance.time_slot, Attendance.student_id),
+    ))
+
+
+async def backfill_if_empty(conn):
+    # First start with the rollup tables: build them from existing attendance
+    if conn.dialect.name != "postgresql":
+        return
+    # One worker builds them, the others wait and then find them filled
+    await lock_schema(conn)
+    has_rollup = await conn.execute(select(AttendanceDaily.day).limit(1))
+    has_attendance = await conn.execute(select(Attendance.id).limit(1))
+    if has_rollup.first() is None and has_attendance.first() is not None:
+        print("Building attendance rollups")
+        await rebuild(conn)
+
+
+async def summary(session, bounds, slot=None):
+    # Same numbers as the raw GROUP BY queries for whole-day ranges, read from
+    # the rollups. Per-student counts need whole months, so week ranges fall
+    # back to the raw table for that part.
+    start, end = bounds
+    daily_filters = [AttendanceDaily.day >= start, AttendanceDaily.day < end]
+    if slot:
+        daily_filters.append(AttendanceDaily.time_slot == slot)
+
+    per_day = await session.execute(
+        select(AttendanceDaily.day, func.sum(AttendanceDaily.present))
+        .where(*daily_filters)
+        .group_by(AttendanceDaily.day)
+        .order_by(AttendanceDaily.day)
+    )
+    per_slot = await session.execute(
+        select(AttendanceDaily.time_slot, func.sum(AttendanceDaily.present))
+        .where(*daily_filters)
+        .group_by(AttendanceDaily.time_slot)
+        .order_by(AttendanceDaily.time_slot)
+    )
+    sessions = await session.execute(
+        select(func.count()).select_from(AttendanceDaily).where(*daily_filters, AttendanceDaily.present > 0)
+    )
+
+    if start.day == 1 and end.day == 1:
+        counts = (
+            select(AttendanceStudentMonthly.student_id, func.sum(AttendanceStudentMonthly.present).label("present"))
+            .where(AttendanceStudentMonthly.month >= start, AttendanceStudentMonthly.month < end)
+        )
+        if slot:
+            counts = counts.where(AttendanceStudentMonthly.time_slot == slot)
+        counts = counts.group_by(AttendanceStudentMonthly.student_id).subquery()
+    else:
+        counts = select(Attendance.student_id, func.count(Attendance.id).label("present")).where(
+            Attendance.day >= start, Attendance.day < end
+        )
+        if slot:
+            counts = counts.where(Attendance.time_slot == slot)
+        counts = counts.group_by(Attendance.student_id).subquery()
+
+    per_student = await session.execute(
+        select(Student.id, Student.enrollment_number, Student.name, func.coalesce(counts.c.present, 0))
+        .outerjoin(counts, counts.c.student_id == Student.id)
+        .order_by(Student.name)
+    )
+
+    return (
+        [(day, int(count)) for day, count in per_day.all()],
+        [(time_slot, int(count)) for time_slot, count in per_slot.all()],
+        sessions.scalar() or 0,
+        [(student_id, enrollment, name, int(present)) for student_id, enrollment, name, present in per_student.all()],
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild the attendance rollup tables")
+    parser.add_argument("--start", help="first day (YYYY-MM-DD), rounded down to its month")
+    parser.add_argument("--end", help="end day, exclusive (YYYY-MM-DD), rounded up to a month")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else None
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else None
+
+    async with engine.begin() as conn:
+        await lock_schema(conn)
+        await conn.run_sync(Base.metadata.create_all)
+        await rebuild(conn, start, end)
+    await engine.dispose()
+    print("Attendance rollups rebuilt")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,5 @@
-from datetime import datetime, time
+import base64
+from datetime import date, datetime, time, timedelta
 
 def get_current_time_slot():
     now = datetime.now().time()
@@ -20,3 +21,31 @@ def get_current_time_slot():
         return "12:10 PM - 1:40 PM"
     
     return None
+
+
+def period_bounds(period, target_date):
+    # Half-open [start, end) day range of the period containing target_date,
+    # or None for an unknown period
+    if period == "day":
+        return target_date, target_date + timedelta(days=1)
+    if period == "week":
+        start = target_date - timedelta(days=target_date.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = target_date.replace(day=1)
+        if start.month == 12:
+            return start, date(start.year + 1, 1, 1)
+        return start, date(start.year, start.month + 1, 1)
+    if period == "year":
+        return date(target_date.year, 1, 1), date(target_date.year + 1, 1, 1)
+    return None
+
+
+def encode_cursor(timestamp, row_id):
+    # Opaque keyset cursor for listings ordered by (date desc, id desc)
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(timestamp), int(row_id)
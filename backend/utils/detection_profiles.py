@@ -0,0 +1,149 @@
+import json
+import os
+from pathlib import Path
+import numpy as np
+from utils.model_registry import get_mtcnn
+
+# Per-camera MTCNN settings. A profile fixes the smallest face worth finding
+# (min_face_size, in pixels of the FRAME_MAX_WIDTH frame), the ratio between
+# pyramid scales (factor; smaller means fewer scales, faster but coarser),
+# the P/R/O-Net thresholds and an optional region of interest given as
+# (x1, y1, x2, y2) fractions of the frame. Websocket clients pick a profile
+# with ?profile=<name>. DETECTION_PROFILES_PATH may name a JSON file with
+# more profiles, e.g. {"gate-2": {"min_face_size": 60, "roi": [0.2, 0, 0.8, 1]}}.
+#
+# On a stream, RegionTracker shrinks the region to the area around the faces
+# of the last frame. A frame where the shrunk region finds nothing is
+# detected again in the full region, and every ROI_REFRESH_FRAMES frames the
+# full region is searched anyway so people entering elsewhere are not missed.
+
+DETECTION_PROFILE = os.getenv("DETECTION_PROFILE", "default")
+DETECTION_PROFILES_PATH = os.getenv("DETECTION_PROFILES_PATH", "")
+ROI_TRACKING = os.getenv("ROI_TRACKING", "1")
+# Margin around the last faces' bounding box, in box widths / heights on each side
+ROI_MARGIN = float(os.getenv("ROI_MARGIN", "1.0"))
+ROI_REFRESH_FRAMES = int(os.getenv("ROI_REFRESH_FRAMES", "10"))
+
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+# facenet_pytorch MTCNN defaults, what the live path always used
+MTCNN_DEFAULTS = {"min_face_size": 20, "factor": 0.709, "thresholds": [0.6, 0.7, 0.7]}
+
+
+class DetectionProfile:
+    def __init__(self, name, min_face_size=20, factor=0.709, thresholds=(0.6, 0.7, 0.7), roi=None):
+        self.name = name
+        self.min_face_size = min_face_size
+        self.factor = factor
+        self.thresholds = list(thresholds)
+        self.roi = tuple(roi) if roi else None
+
+    def mtcnn(self):
+        # Only non-default options make a registry variant, so the default
+        # profile is the shared base instance
+        options = {
+            key: value
+            for key, value in (
+                ("min_face_size", self.min_face_size),
+                ("factor", self.factor),
+                ("thresholds", self.thresholds),
+            )
+            if value != MTCNN_DEFAULTS[key]
+        }
+        return get_mtcnn(**options)
+
+    def region(self, width, height, roi=None):
+        # Pixel bounds (x1, y1, x2, y2) of roi, else of the profile's own
+        # region, else the whole frame: the first one that can hold a face
+        # of min_face_size (MTCNN builds no pyramid for smaller inputs)
+        for bounds in (roi, self.roi):
+            if bounds:
+                x1, x2 = max(0, int(bounds[0] * width)), min(width, int(np.ceil(bounds[2] * width)))
+                y1, y2 = max(0, int(bounds[1] * height)), min(height, int(np.ceil(bounds[3] * height)))
+                if min(x2 - x1, y2 - y1) >= self.min_face_size:
+                    return x1, y1, x2, y2
+        return 0, 0, width, height
+
+
+PROFILES = {
+    "default": DetectionProfile("default"),
+    # Close-up camera in front of a single person: big faces in the middle
+    "kiosk": DetectionProfile("kiosk", min_face_size=80, factor=0.6, roi=(0.15, 0.0, 0.85, 1.0)),
+    # Doorway / corridor camera: mid-sized faces, slightly coarser pyramid
+    "corridor": DetectionProfile("corridor", min_face_size=40, factor=0.65),
+    # Cheapest pass for overloaded workers: few scales, stricter stages
+    "fast": DetectionProfile("fast", min_face_size=60, factor=0.5, thresholds=(0.7, 0.8, 0.8)),
+}
+
+
+def load_profiles(path=DETECTION_PROFILES_PATH):
+    if not path:
+        return
+    try:
+        for name, options in json.loads(Path(path).read_text()).items():
+            PROFILES[name] = DetectionProfile(name, **options)
+        print(f"Loaded detection profiles from {path}")
+    except Exception as e:
+        print(f"Could not load detection profiles from {path}: {e}")
+
+
+load_profiles()
+
+
+def get_profile(name=None):
+    name = name or DETECTION_PROFILE
+    profile = PROFILES.get(name)
+    if profile is None:
+        print(f"Unknown detection profile '{name}', using default")
+        profile = PROFILES["default"]
+    return profile
+
+
+class RegionTracker:
+    """Per-connection detection region that follows the faces of a stream.
+
+    next_roi() gives the region for the next frame (None for the profile's
+    full region), update() takes the boxes found in the frame of the given
+    (width, height).
+    """
+
+    def __init__(self, profile, margin=ROI_MARGIN, refresh_frames=ROI_REFRESH_FRAMES):
+        self.profile = profile
+        self.margin = margin
+        self.refresh_frames = refresh_frames
+
+        self.frames = 0
+        self.cropped = 0
+
+        self._roi = None
+        self._since_full = 0
+
+    def next_roi(self):
+        self.frames += 1
+        if self._roi is None or self._since_full >= self.refresh_frames:
+            self._since_full = 0
+            return None
+        self._since_full += 1
+        self.cropped += 1
+        return self._roi
+
+    def update(self, boxes, size):
+        boxes = np.asarray([box for box in boxes if box is not None], dtype=np.float32).reshape(-1, 4)
+        if not len(boxes):
+            self._roi = None
+            return
+
+        width, height = size
+        x1, y1 = boxes[:, :2].min(axis=0)
+        x2, y2 = boxes[:, 2:].max(axis=0)
+        margin_x, margin_y = (x2 - x1) * self.margin, (y2 - y1) * self.margin
+        bounds = self.profile.roi or FULL_FRAME
+        roi = (
+            max(bounds[0], (x1 - margin_x) / width),
+            max(bounds[1], (y1 - margin_y) / height),
+            min(bounds[2], (x2 + margin_x) / width),
+            min(bounds[3], (y2 + margin_y) / height),
+        )
+        self._roi = roi if roi[2] > roi[0] and roi[3] > roi[1] else None
+
+    def stats(self):
+        return {"roi_frames": self.cropped}
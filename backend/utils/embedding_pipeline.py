@@ -0,0 +1,128 @@
+import time
+from collections import defaultdict
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset, DataLoader
+from facenet_pytorch import extract_face, fixed_image_standardization
+from utils.model_registry import device, get_mtcnn, inference_context
+from utils.inference_backends import get_embedder
+
+# Batched enrollment / re-index pipeline:
+#   1. DataLoader workers decode (and downscale) images in parallel
+#   2. MTCNN detects faces over stacks of equally sized images
+#   3. aligned crops are pushed through ResNet in fixed-size batches
+
+MAX_IMAGE_SIDE = 1024
+
+
+class ImagePathDataset(Dataset):
+    def __init__(self, image_paths, max_side=MAX_IMAGE_SIDE):
+        self.image_paths = list(image_paths)
+        self.max_side = max_side
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, index):
+        path = self.image_paths[index]
+        try:
+            img = Image.open(path)
+            # Let the JPEG decoder drop resolution we are going to throw away
+            img.draft("RGB", (self.max_side, self.max_side))
+            img = img.convert("RGB")
+            if max(img.size) > self.max_side:
+                img.thumbnail((self.max_side, self.max_side), Image.Resampling.BILINEAR)
+            return index, np.asarray(img)
+        except Exception as e:
+            print(f"skipping image {path} due to error: {e}")
+            return index, None
+
+
+def _collate(batch):
+    return batch
+
+
+def _detect_batch(mtcnn, items, prob_threshold):
+    # items: list of (index, uint8 HxWx3 array) that all share one shape
+    stacked = torch.from_numpy(np.stack([array for _, array in items]))
+    with inference_context():
+        batch_boxes, batch_probs = mtcnn.detect(stacked)
+
+    crops = []
+    for (index, array), boxes, probs in zip(items, batch_boxes, batch_probs):
+        # detect() orders boxes largest first, matching mtcnn(img) selection
+        if boxes is None or probs[0] is None or probs[0] <= prob_threshold:
+            continue
+        face = extract_face(Image.fromarray(array), boxes[0], mtcnn.image_size, mtcnn.margin)
+        if mtcnn.post_process:
+            face = fixed_image_standardization(face)
+        crops.append((index, face))
+    return crops
+
+
+def iter_face_crops(image_paths, num_workers=0, detect_batch_size=8, prob_threshold=0.90):
+    # Yields (images in the loader batch, [(index, crop), ...]) per batch
+    mtcnn = get_mtcnn()
+    loader = DataLoader(
+        ImagePathDataset(image_paths),
+        batch_size=detect_batch_size,
+        num_workers=num_workers,
+        collate_fn=_collate,
+    )
+
+    for batch in loader:
+        by_shape = defaultdict(list)
+        for index, array in batch:
+            if array is not None:
+                by_shape[array.shape].append((index, array))
+
+        crops = []
+        for items in by_shape.values():
+            crops.extend(_detect_batch(mtcnn, items, prob_threshold))
+        yield len(batch), crops
+
+
+def embed_images(
+    image_paths,
+    num_workers=0,
+    detect_batch_size=8,
+    resnet_batch_size=32,
+    prob_threshold=0.90,
+    report_every=0,
+):
+    # Returns one embedding (or None when no usable face was found) per path
+    embedder = get_embedder()
+
+    embaddings = [None] * len(image_paths)
+    pending = []
+    processed = 0
+    start = time.perf_counter()
+
+    def flush(crops):
+        batch = torch.stack([face for _, face in crops]).to(device)
+        batch_embaddings = embedder(batch).cpu()
+        for (index, _), embadding in zip(crops, batch_embaddings):
+            embaddings[index] = embadding
+
+    for batch_size, crops in iter_face_crops(image_paths, num_workers, detect_batch_size, prob_threshold):
+        pending.extend(crops)
+
+        while len(pending) >= resnet_batch_size:
+            flush(pending[:resnet_batch_size])
+            pending = pending[resnet_batch_size:]
+
+        previous = processed
+        processed += batch_size
+        if report_every and processed // report_every != previous // report_every:
+            elapsed = time.perf_counter() - start
+            print(f"Embedded {processed}/{len(image_paths)} images ({processed / elapsed:.1f} images/s)")
+
+    if pending:
+        flush(pending)
+
+    elapsed = time.perf_counter() - start
+    if report_every and processed:
+        print(f"Done: {processed} images in {elapsed:.1f}s ({processed / elapsed:.1f} images/s)")
+
+    return embaddings
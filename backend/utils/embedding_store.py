@@ -0,0 +1,424 @@
+import base64
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process lock, run one worker per store
+    fcntl = None
+
+# On-disk gallery store, shared by the worker processes of a host:
+#   vectors.<n>.f32    raw float32 rows, capacity grows by doubling. Workers map
+#                      it read-only, so the page cache holds one copy per host;
+#                      rows are written through a file handle
+#   wal.<gen>.log      one JSON line per upsert/delete since the last checkpoint
+#   ids.json           id table snapshot (row i belongs to ids[i], None for a
+#                      deleted row) naming the current vectors/WAL files,
+#                      replaced atomically
+#   version            change counter, bumped by every upsert/delete/rebuild
+#   lock               flock target, held exclusively by writers
+# Every change is appended and fsynced to the WAL before it touches the matrix,
+# so a crash between checkpoints is recovered by replaying the log on open.
+# A worker whose version is behind catches up the same way: it replays the
+# WAL records written since (after a checkpoint, the new snapshot first) into
+# its id table; the vectors are already in the shared file.
+# Galleries search the mapped rows in place, so a written row is never
+# rewritten: upserts append a row and retire the id's old one, deletes only
+# retire it. The checkpoint compacts the live rows into a new vectors file.
+
+MODELS_PATH = os.getenv("MODELS_PATH")
+if MODELS_PATH:
+    EMBEDDINGS_STORE_PATH = Path(MODELS_PATH) / "embeddings_store"
+    LEGACY_EMBADDINGS_PATH = Path(MODELS_PATH) / "embaddings.pt"
+else:
+    models_dir = Path(__file__).resolve().parent.parent / "face_detection_models"
+    EMBEDDINGS_STORE_PATH = models_dir / "embeddings_store"
+    LEGACY_EMBADDINGS_PATH = models_dir / "embaddings.pt"
+
+CHECKPOINT_EVERY = int(os.getenv("EMBEDDINGS_CHECKPOINT_EVERY", "256"))
+
+
+def _encode(vector):
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def _decode(data):
+    return np.frombuffer(base64.b64decode(data), dtype="<f4")
+
+
+def _atomic_write(path, data):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class EmbeddingStore:
+    """Append/upsert/delete store of one embedding per id with O(1) updates.
+
+    Several processes may open the same store: writes are serialized by an
+    exclusive flock, and refresh() brings a process up to date with the
+    changes the others made (version tells how far it is).
+    """
+
+    def __init__(self, root=EMBEDDINGS_STORE_PATH, dim=512, initial_capacity=1024):
+        self.root = Path(root)
+        self.dim = dim
+        self.initial_capacity = initial_capacity
+        self.ids_path = self.root / "ids.json"
+
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.root / "lock", "ab")
+        self._version = self._open_version()
+        self.version = 0
+
+        self.vectors = None
+        self._file = None
+        self._file_path = None
+        self._wal = None
+
+        with self._locked():
+            self._load_snapshot(self._read_snapshot())
+            replayed = self._read_wal(repair=True)
+            if replayed:
+                print(f"Replayed {replayed} embedding store WAL records")
+            self._remove_stale_files()
+            self.version = self._current_version()
+
+    def __len__(self):
+        return len(self.rows)
+
+    @contextmanager
+    def _locked(self, shared=False):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _open_version(self):
+        path = self.root / "version"
+        with open(path, "ab") as f:
+            if f.tell() < 8:
+                f.truncate(8)
+        return np.memmap(path, dtype="<u8", mode="r+", shape=(1,))
+
+    def _current_version(self):
+        return int(self._version[0])
+
+    def _bump_version(self):
+        self.version += 1
+        self._version[0] = self.version
+
+    def _wal_path(self, generation):
+        return self.root / f"wal.{generation}.log"
+
+    def _nbytes(self, rows):
+        return rows * self.dim * 4
+
+    def _read_snapshot(self):
+        if self.ids_path.exists():
+            return json.loads(self.ids_path.read_text())
+        return {"generation": 0, "vectors": "vectors.0.f32", "ids": [], "capacity": self.initial_capacity}
+
+    def _load_snapshot(self, snapshot):
+        self.generation = snapshot["generation"]
+        self.vectors_file = snapshot["vectors"]
+        self.ids = snapshot["ids"]
+        self.rows = {id_: row for row, id_ in enumerate(self.ids) if id_ is not None}
+        self.capacity = snapshot["capacity"]
+
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self._wal_path(self.generation), "a", encoding="utf-8")
+        self._wal_offset = 0
+        self._wal_records = 0
+        self._open_vectors()
+
+    def _open_vectors(self):
+        # (Re)opens the current vectors file and maps all of it read-only
+        self.vectors = None
+        path = self.root / self.vectors_file
+        if self._file_path != path:
+            if self._file is not None:
+                self._file.close()
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+            self._file = os.fdopen(fd, "r+b", buffering=0)
+            self._file_path = path
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._nbytes(self.capacity):
+            self._file.truncate(self._nbytes(self.capacity))
+        self.capacity = max(self.capacity, size // self._nbytes(1))
+        self._map()
+
+    def _map(self):
+        self.vectors = np.memmap(self._file_path, dtype="<f4", mode="r", shape=(self.capacity, self.dim))
+
+    def _remove_stale_files(self):
+        current = {self.ids_path.name, "lock", "version", self.vectors_file, self._wal_path(self.generation).name}
+        for path in self.root.glob("*"):
+            if path.name not in current:
+                try:
+                    path.unlink()
+                except OSError:
+                    # Still mapped by another process on Windows; next time
+                    pass
+
+    def _ensure_capacity(self, rows):
+        if rows <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < rows:
+            new_capacity *= 2
+
+        # Maps of the old size stay valid, the file only grows
+        self.vectors = None
+        self._file.truncate(self._nbytes(new_capacity))
+        self.capacity = new_capacity
+        self._map()
+
+    def _write(self, row, vector):
+        self._file.seek(self._nbytes(row))
+        self._file.write(np.asarray(vector, dtype="<f4").tobytes())
+
+    def _read_wal(self, repair=False):
+        # Applies the WAL records after _wal_offset to the id table. With
+        # repair (on open) the rows they touched are rewritten with their
+        # final vectors and a torn last line is cut off.
+        wal_path = self._wal_path(self.generation)
+        if not wal_path.exists():
+            return 0
+
+        count = 0
+        writes = {}
+        with open(wal_path, "rb") as f:
+            f.seek(self._wal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn last line from a crash mid-append; it was never acknowledged
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                write = self._apply(record)
+                if write is not None:
+                    writes[write[0]] = write[1]
+                self._wal_offset += len(line)
+                count += 1
+
+        if repair:
+            self._ensure_capacity(len(self.ids))
+            for row, vector in writes.items():
+                if row < len(self.ids):
+                    self._write(row, vector)
+            if wal_path.stat().st_size > self._wal_offset:
+                os.truncate(wal_path, self._wal_offset)
+        elif len(self.ids) > self.capacity:
+            # Another process grew the vectors file
+            self._open_vectors()
+
+        self._wal_records += count
+        return count
+
+    def _catch_up(self):
+        # Apply what other processes wrote since this one last looked
+        version = self._current_version()
+        if version == self.version:
+            return False
+        snapshot = self._read_snapshot()
+        if snapshot["generation"] != self.generation:
+            self._load_snapshot(snapshot)
+        self._read_wal()
+        self.version = version
+        return True
+
+    def refresh(self):
+        # Cheap when nothing changed: one read of the shared version counter
+        if self._current_version() == self.version:
+            return False
+        with self._locked(shared=True):
+            return self._catch_up()
+
+    def _log(self, record):
+        line = json.dumps(record) + "\n"
+        self._wal.write(line)
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._wal_offset += len(line.encode("utf-8"))
+        self._wal_records += 1
+
+    def _apply(self, record):
+        # Updates the id table; returns the (row, vector) the vectors file must hold
+        if record["op"] == "upsert":
+            old = self.rows.get(record["id"])
+            if old is not None:
+                self.ids[old] = None
+            row = len(self.ids)
+            self.ids.append(record["id"])
+            self.rows[record["id"]] = row
+            return row, _decode(record["vector"])
+
+        if record["op"] == "delete":
+            row = self.rows.pop(record["id"], None)
+            if row is not None:
+                # The vector stays: a gallery built before the delete may still read it
+                self.ids[row] = None
+            return None
+
+        raise ValueError(f"Unknown embedding store op '{record['op']}'")
+
+    def _write_snapshot(self, generation):
+        snapshot = {
+            "generation": generation,
+            "vectors": self.vectors_file,
+            "ids": self.ids,
+            "capacity": self.capacity,
+            "dim": self.dim,
+        }
+        _atomic_write(self.ids_path, json.dumps(snapshot).encode("utf-8"))
+
+    def _switch_generation(self, generation):
+        # The snapshot rename is the commit point; files of the old generation
+        # are only removed afterwards.
+        open(self._wal_path(generation), "w").close()
+        self._write_snapshot(generation)
+
+        self._wal.close()
+        self.generation = generation
+        self._wal = open(self._wal_path(generation), "a", encoding="utf-8")
+        self._wal_offset = 0
+        self._wal_records = 0
+        self._remove_stale_files()
+
+    def _maybe_checkpoint(self):
+        if self._wal_records >= CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self._locked():
+            self._catch_up()
+            if len(self.rows) < len(self.ids):
+                # Retired rows are dropped by moving the live ones to a new file
+                live = sorted(self.rows.values())
+                self._write_generation(self.vectors[live], [self.ids[row] for row in live])
+                self._bump_version()
+                return
+            # Vectors keep their file; only the WAL moves to the new generation
+            os.fsync(self._file.fileno())
+            self._switch_generation(self.generation + 1)
+
+    def upsert(self, id_, vector):
+        vector = np.asarray(vector, dtype="<f4").reshape(self.dim)
+        record = {"op": "upsert", "id": id_, "vector": _encode(vector)}
+        with self._locked():
+            self._catch_up()
+            self._log(record)
+            row, _ = self._apply(record)
+            self._ensure_capacity(row + 1)
+            self._write(row, vector)
+            self._bump_version()
+        self._maybe_checkpoint()
+        return row
+
+    def delete(self, id_):
+        with self._locked():
+            self._catch_up()
+            if id_ not in self.rows:
+                return False
+
+            record = {"op": "delete", "id": id_}
+            self._log(record)
+            self._apply(record)
+            self._bump_version()
+        self._maybe_checkpoint()
+        return True
+
+    def replace_all(self, vectors, ids):
+        # Bulk rebuild (offline re-index): write a new generation and swap to it
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype="<f4").reshape(-1, self.dim))
+        if len(ids) != len(set(ids)) or len(ids) != len(vectors):
+            raise ValueError("replace_all needs one vector per unique id")
+
+        with self._locked():
+            self._catch_up()
+            self._write_generation(vectors, ids)
+            self._bump_version()
+
+    def _write_generation(self, vectors, ids):
+        # Caller holds the lock. Maps of the old vectors file stay valid.
+        generation = self.generation + 1
+        capacity = self.capacity
+        while capacity < len(ids):
+            capacity *= 2
+
+        vectors_file = f"vectors.{generation}.f32"
+        with open(self.root / vectors_file, "wb") as f:
+            f.write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+            f.truncate(self._nbytes(capacity))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.vectors_file = vectors_file
+        self.capacity = capacity
+        self.ids = list(ids)
+        self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+        self._open_vectors()
+        self._switch_generation(generation)
+
+    def snapshot(self):
+        # Zero-copy view of the rows written so far plus a copy of the id
+        # table; the rows of deleted or re-enrolled ids have a None id
+        with self._lock:
+            return self.vectors[: len(self.ids)], list(self.ids)
+
+    def import_legacy(self, path=LEGACY_EMBADDINGS_PATH):
+        self.refresh()
+        if len(self) or not os.path.exists(path):
+            return False
+
+        # Only the legacy file needs torch; the store itself is plain numpy
+        import torch
+
+        saved_data = torch.load(path, map_location="cpu")
+        embeddings, names = saved_data[0], saved_data[1]
+        if embeddings.ndim == 1:
+            embeddings = embeddings.unsqueeze(0)
+
+        # The old file appended a new row on every re-enrollment; keep the latest
+        latest = {}
+        for row, name in enumerate(names):
+            latest[name] = row
+        ids = list(latest)
+        vectors = embeddings[[latest[id_] for id_ in ids]].to(torch.float32).numpy()
+
+        self.replace_all(vectors, ids)
+        print(f"Imported {len(ids)} embeddings from {path}")
+        return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EmbeddingStore()
+                _store.import_legacy()
+    return _store
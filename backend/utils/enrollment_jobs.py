@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from utils import model_loader
+from utils.embedding_store import EMBEDDINGS_STORE_PATH
+
+# Enrollment embedding runs as queued background jobs on a dedicated pool so
+# MTCNN/ResNet never block the event loop serving the live websockets.
+# A job runs in the worker process that queued it, but its state is kept as
+# one JSON file per job next to the embedding store, so a poll answered by
+# any worker of the host sees it.
+
+ENROLLMENT_WORKERS = int(os.getenv("ENROLLMENT_WORKERS", "1"))
+ENROLLMENT_MAX_BATCH = int(os.getenv("ENROLLMENT_MAX_BATCH", "16"))
+ENROLLMENT_JOBS_PATH = Path(os.getenv("ENROLLMENT_JOBS_PATH", EMBEDDINGS_STORE_PATH.parent / "enrollment_jobs"))
+MAX_TRACKED_JOBS = 1000
+
+_executor = ThreadPoolExecutor(max_workers=ENROLLMENT_WORKERS, thread_name_prefix="enrollment")
+_queue = None
+_workers = []
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _job_path(job_id):
+    return ENROLLMENT_JOBS_PATH / f"{job_id}.json"
+
+
+def _save(job):
+    # Readers in other workers see the old or the new state, never a partial file
+    tmp_path = ENROLLMENT_JOBS_PATH / f".{job['job_id']}.{uuid.uuid4().hex}.tmp"
+    tmp_path.write_text(json.dumps(job))
+    os.replace(tmp_path, _job_path(job["job_id"]))
+
+
+def _prune():
+    # Forget the oldest jobs of the host beyond MAX_TRACKED_JOBS
+    files = sorted(ENROLLMENT_JOBS_PATH.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for path in files[: max(0, len(files) - MAX_TRACKED_JOBS)]:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            # Pruned by another worker
+            pass
+
+
+def _ensure_workers():
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if not _workers:
+        for _ in range(ENROLLMENT_WORKERS):
+            _workers.append(asyncio.create_task(_worker()))
+
+
+def submit_enrollment(enrollment_number: str, image_paths):
+    _ensure_workers()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "enrollment_number": enrollment_number,
+        "status": "queued",
+        "images": len(image_paths),
+        "faces_found": None,
+        "error": None,
+        "created_at": _now(),
+        "finished_at": None,
+    }
+    ENROLLMENT_JOBS_PATH.mkdir(parents=True, exist_ok=True)
+    _save(job)
+    _prune()
+
+    _queue.put_nowait((job, enrollment_number, list(image_paths)))
+    return job
+
+
+def get_job(job_id: str):
+    # job_id comes from the URL: only ids submit_enrollment can have made
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+        return None
+    try:
+        return json.loads(_job_path(job_id).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _finish(job, **fields):
+    job.update(fields, finished_at=_now())
+    _save(job)
+
+
+async def _worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _queue.get()]
+        # Fold every enrollment already waiting into the same embedding pass
+        while len(batch) < ENROLLMENT_MAX_BATCH and not _queue.empty():
+            batch.append(_queue.get_nowait())
+
+        for job, _, _ in batch:
+            job["status"] = "running"
+            _save(job)
+
+        enrollments = [(enrollment_number, paths) for _, enrollment_number, paths in batch]
+        try:
+            # The first batch of a fresh worker waits for the models
+            await model_loader.load_models()
+            from utils.face_utils import update_students_embaddings
+
+            faces_found = await loop.run_in_executor(_executor, update_students_embaddings, enrollments)
+            for (job, _, _), found in zip(batch, faces_found):
+                if found:
+                    _finish(job, status="done", faces_found=found)
+                else:
+                    _finish(job, status="failed", faces_found=0, error="No valid face found in the uploaded images")
+        except Exception as e:
+            print(f"Enrollment batch failed: {e}")
+            for job, _, _ in batch:
+                _finish(job, status="failed", error=str(e))
+        finally:
+            for _ in batch:
+                _queue.task_done()
@@ -0,0 +1,112 @@
+import itertools
+import os
+import numpy as np
+
+# Per-connection face tracks. Detections are associated with existing tracks
+# by box IoU; a track that has been recognized keeps its identity, so ResNet
+# only runs for new tracks, unknown faces (after a short back-off) and a
+# periodic re-check of known ones.
+
+FACE_TRACKING = os.getenv("FACE_TRACKING", "1")
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_MAX_MISSED = int(os.getenv("TRACK_MAX_MISSED", "3"))
+TRACK_RECHECK_FRAMES = int(os.getenv("TRACK_RECHECK_FRAMES", "20"))
+TRACK_UNKNOWN_RETRY_FRAMES = int(os.getenv("TRACK_UNKNOWN_RETRY_FRAMES", "2"))
+
+_track_ids = itertools.count(1)
+
+
+def box_iou(a, b):
+    # Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class Track:
+    def __init__(self, box):
+        self.id = next(_track_ids)
+        self.box = box
+        self.identity = None   # (enrollment_number, distance, message) of the last recognition
+        self.confirmed = False  # identity matched the gallery
+        self.age = 0            # frames since the last recognition
+        self.missed = 0         # consecutive frames without a matching detection
+
+
+class FaceTracker:
+    def __init__(
+        self,
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        max_missed=TRACK_MAX_MISSED,
+        recheck_every=TRACK_RECHECK_FRAMES,
+        unknown_retry=TRACK_UNKNOWN_RETRY_FRAMES,
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.recheck_every = recheck_every
+        self.unknown_retry = unknown_retry
+        self.tracks = []
+
+        self.faces = 0
+        self.recognitions = 0
+
+    def update(self, boxes):
+        # Returns the track of every box, in box order
+        assigned = [None] * len(boxes)
+        matched_tracks = set()
+
+        if self.tracks and len(boxes):
+            iou = box_iou([track.box for track in self.tracks], boxes)
+            # Greedy association, best overlaps first
+            for t, b in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[t, b] < self.iou_threshold:
+                    break
+                if t in matched_tracks or assigned[b] is not None:
+                    continue
+                track = self.tracks[t]
+                track.box = boxes[b]
+                track.age += 1
+                track.missed = 0
+                assigned[b] = track
+                matched_tracks.add(t)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+            if track.missed <= self.max_missed:
+                survivors.append(track)
+        self.tracks = survivors
+
+        for b, box in enumerate(boxes):
+            if assigned[b] is None:
+                assigned[b] = Track(box)
+                self.tracks.append(assigned[b])
+
+        self.faces += len(boxes)
+        return assigned
+
+    def needs_recognition(self, track):
+        if track.identity is None:
+            return True
+        return track.age >= (self.recheck_every if track.confirmed else self.unknown_retry)
+
+    def assign(self, track, identity, confirmed):
+        track.identity = identity
+        track.confirmed = confirmed
+        track.age = 0
+        self.recognitions += 1
+
+    def stats(self):
+        return {
+            "tracks": len(self.tracks),
+            "faces": self.faces,
+            "recognitions": self.recognitions,
+        }
@@ -1,62 +1,20 @@
-import torch
-from facenet_pytorch import InceptionResnetV1, MTCNN
-from PIL import Image
 import os
-from pathlib import Path
-from controllers.students_pred import load_embaddings
-
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-
-mtcnn = MTCNN(device=device)
-
-resnet = InceptionResnetV1(pretrained="vggface2").eval().to(device)
-
-current_file_dir = Path(__file__).resolve().parent
-models_dir = (current_file_dir.parent / "face_detection_models").resolve()
-
-MODELS_PATH = os.getenv("MODELS_PATH")
-if MODELS_PATH:
-    EMBADDINGS_PATH = (Path(MODELS_PATH) / "embaddings.pt").resolve()
-else:
-    EMBADDINGS_PATH = (models_dir / "embaddings.pt").resolve()
-
-print(f"Embaddings path: {EMBADDINGS_PATH}")
-
-
-def load_or_create_embeddings(path: str):
-    if os.path.exists(path):
-        try:
-            data = torch.load(path, map_location="cpu")
-            embeddings, names = data[0], data[1]
-
-            if embeddings.ndim == 1:
-                embeddings = embeddings.unsqueeze(0)
+import torch
+from controllers.students_pred import update_gallery
+from utils.embedding_pipeline import embed_images
+from utils.embedding_store import get_store, EMBEDDINGS_STORE_PATH
 
-            embeddings = embeddings.to(torch.float32)
-            return embeddings, names
-        except Exception as e:
-            print("Error reading embedding file:", e)
+print(f"Embaddings store: {EMBEDDINGS_STORE_PATH}")
 
-    return torch.empty((0, 512), dtype=torch.float32), []
+ENROLLMENT_DECODE_WORKERS = int(os.getenv("ENROLLMENT_DECODE_WORKERS", "0"))
 
 
-def update_student_dataset_embaddings(enrollment_number: str, image_path: str):
-    print(f"Processing {len(image_path)} images for student {enrollment_number}...")
+def compute_embaddings(image_paths):
+    # Returns one embedding (or None when no usable face was found) per path
+    return embed_images(image_paths, num_workers=ENROLLMENT_DECODE_WORKERS)
 
-    vectors = []
 
-    for path in image_path:
-        try:
-            img = Image.open(path)
-            img_cropped, prob = mtcnn(img, return_prob=True)
-            if img_cropped is not None and prob > 0.90:
-                img_cropped = img_cropped.unsqueeze(0).to(device)
-                embadding = resnet(img_cropped).detach().cpu()
-                vectors.append(embadding)
-            else:
-                print(f"Face not detected or low probability ({prob}) in image: {path}")
-        except Exception as e:
-            print(f"skipping image {path} due to error: {e}")
+def save_student_embadding(enrollment_number: str, vectors):
     print(
         f"Found {len(vectors)} valid face embeddings for student {enrollment_number}."
     )
@@ -64,7 +22,7 @@ def update_student_dataset_embaddings(enrollment_number: str, image_path: str):
         print(f"No valid face embeddings found for student {enrollment_number}.")
         return False
 
-    stacked_vectors = torch.cat(vectors)
+    stacked_vectors = torch.stack(vectors)
     mean_embadding = torch.mean(stacked_vectors, dim=0)
 
     # mean_embadding = (
@@ -73,21 +31,31 @@ def update_student_dataset_embaddings(enrollment_number: str, image_path: str):
 
     mean_embadding = torch.nn.functional.normalize(mean_embadding, p=2, dim=0)
 
-    existing_embeddings_tensor, existing_names = load_or_create_embeddings(
-        EMBADDINGS_PATH
-    )
-
-    if enrollment_number in existing_names:
-        idx = existing_names.index(enrollment_number)
+    store = get_store()
+    if enrollment_number in store.rows:
         print(f"Updating existing embedding for student {enrollment_number}.")
 
-    new_embeddings_tensor = torch.cat(
-        (existing_embeddings_tensor, mean_embadding.unsqueeze(0)), dim=0
-    )
-    existing_names.append(enrollment_number)
-
-    torch.save([new_embeddings_tensor, existing_names], EMBADDINGS_PATH)
-    load_embaddings()
-    print(f"Embaddings updated and saved to {EMBADDINGS_PATH}")
+    # O(1) upsert into the store, then patch the live gallery in place
+    store.upsert(enrollment_number, mean_embadding.numpy())
+    update_gallery(enrollment_number, mean_embadding)
+    print(f"Embaddings updated and saved to {EMBEDDINGS_STORE_PATH}")
 
     return True
+
+
+def update_students_embaddings(enrollments):
+    # enrollments: list of (enrollment_number, image_paths). Images from all
+    # students share the ResNet batches; returns faces found per student.
+    all_paths = [path for _, paths in enrollments for path in paths]
+    print(f"Processing {len(all_paths)} images for {len(enrollments)} students...")
+    embaddings = compute_embaddings(all_paths)
+
+    faces_found = []
+    offset = 0
+    for enrollment_number, paths in enrollments:
+        vectors = [e for e in embaddings[offset:offset + len(paths)] if e is not None]
+        offset += len(paths)
+        save_student_embadding(enrollment_number, vectors)
+        faces_found.append(len(vectors))
+
+    return faces_found
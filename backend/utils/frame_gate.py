@@ -0,0 +1,120 @@
+import os
+import numpy as np
+import torch
+from PIL import Image
+from facenet_pytorch.models.utils.detect_face import imresample
+from utils.model_registry import get_mtcnn, inference_context
+from utils.frame_preprocess import fit_width
+
+# Cheap checks ahead of the full detection pass, per websocket connection:
+#   1. unchanged  the frame's tiny grayscale thumbnail barely differs from the
+#                 last frame that was fully processed -> reuse that result
+#   2. empty      (optional) P-Net alone on a low resolution pyramid finds no
+#                 face candidate -> reply "no face" without the cascade
+# A frame is never gated more than GATE_MAX_SKIPPED times in a row, so a
+# person standing still is still re-detected regularly.
+
+FRAME_GATING = os.getenv("FRAME_GATING", "1")
+GATE_DIFF_THRESHOLD = float(os.getenv("GATE_DIFF_THRESHOLD", "3"))
+GATE_MAX_SKIPPED = int(os.getenv("GATE_MAX_SKIPPED", "10"))
+GATE_THUMB_WIDTH = 32
+FACE_PRESENCE_CHECK = os.getenv("FACE_PRESENCE_CHECK", "0")
+PRESENCE_WIDTH = int(os.getenv("PRESENCE_WIDTH", "160"))
+PRESENCE_THRESHOLD = float(os.getenv("PRESENCE_THRESHOLD", "0.95"))
+
+NO_FACE = ("no face", 0, "No face detected", None)
+
+_totals = {"frames": 0, "unchanged": 0, "empty": 0}
+
+
+def thumbnail(image, width=GATE_THUMB_WIDTH):
+    height = max(1, round(image.size[1] * width / image.size[0]))
+    small = image.resize((width, height), Image.Resampling.BOX).convert("L")
+    return np.asarray(small, dtype=np.int16)
+
+
+def face_present(image, width=PRESENCE_WIDTH, threshold=PRESENCE_THRESHOLD, mtcnn=None):
+    # First MTCNN stage only: any P-Net window above threshold at any scale.
+    # Errs on the side of "present", the full cascade filters false alarms.
+    mtcnn = mtcnn or get_mtcnn()
+    small = fit_width(image, width)
+    ratio = small.size[0] / image.size[0]
+    # Smallest face we still care about, in thumbnail pixels (P-Net needs 12)
+    min_face = max(12.0, mtcnn.min_face_size * ratio)
+
+    pixels = torch.from_numpy(np.array(small)).permute(2, 0, 1).unsqueeze(0).float()
+    h, w = pixels.shape[2:4]
+    scale = 12.0 / min_face
+    with inference_context():
+        while min(h, w) * scale >= 12:
+            im_data = imresample(pixels, (int(h * scale + 1), int(w * scale + 1)))
+            _, probs = mtcnn.pnet((im_data - 127.5) * 0.0078125)
+            if probs[:, 1].max().item() >= threshold:
+                return True
+            scale *= mtcnn.factor
+    return False
+
+
+class FrameGate:
+    """Decides per frame whether a connection needs the full detection pass.
+
+    check() is cheap enough for the event loop. face_present() runs P-Net and
+    belongs on the inference executor. Call processed() with the result of
+    every frame that was not skipped, so the next frames compare against it.
+    """
+
+    def __init__(self, diff_threshold=GATE_DIFF_THRESHOLD, max_skipped=GATE_MAX_SKIPPED,
+                 presence_check=FACE_PRESENCE_CHECK == "1"):
+        self.diff_threshold = diff_threshold
+        self.max_skipped = max_skipped
+        self.presence_check = presence_check
+
+        self.frames = 0
+        self.unchanged = 0
+        self.empty = 0
+
+        self._reference = None
+        self._thumb = None
+        self._result = None
+        self._skipped = 0
+
+    def check(self, image):
+        # Returns the previous result when the frame can be skipped, else None
+        self.frames += 1
+        _totals["frames"] += 1
+        self._thumb = thumbnail(image)
+
+        if self._result is None or self._reference is None or self._reference.shape != self._thumb.shape:
+            return None
+        diff = float(np.abs(self._thumb - self._reference).mean())
+        if diff > self.diff_threshold or self._skipped >= self.max_skipped:
+            return None
+
+        self._skipped += 1
+        self.unchanged += 1
+        _totals["unchanged"] += 1
+        return self._result
+
+    def empty_frame(self):
+        # The presence check found no face: counts as processed with no faces
+        self.empty += 1
+        _totals["empty"] += 1
+
+    def processed(self, result):
+        self._reference = self._thumb
+        self._result = result
+        self._skipped = 0
+
+    def stats(self):
+        return {"gated_unchanged": self.unchanged, "gated_empty": self.empty}
+
+
+def get_metrics():
+    gated = _totals["unchanged"] + _totals["empty"]
+    return {
+        **_totals,
+        "gated": gated,
+        "gated_rate": round(gated / _totals["frames"], 4) if _totals["frames"] else 0,
+        "diff_threshold": GATE_DIFF_THRESHOLD,
+        "presence_check": FACE_PRESENCE_CHECK == "1",
+    }
@@ -0,0 +1,97 @@
+import asyncio
+import math
+import os
+
+WS_TARGET_FPS = float(os.getenv("WS_TARGET_FPS", "2"))
+# Range a client may ask for with ?fps=
+WS_MIN_FPS = float(os.getenv("WS_MIN_FPS", "0.1"))
+WS_MAX_FPS = float(os.getenv("WS_MAX_FPS", "30"))
+
+
+def parse_fps(value):
+    # Client supplied target fps: WS_TARGET_FPS when missing or not a number,
+    # otherwise clamped to [WS_MIN_FPS, WS_MAX_FPS]. 0 asks for no cap and
+    # gets the highest rate allowed.
+    try:
+        fps = float(value)
+    except (TypeError, ValueError):
+        return WS_TARGET_FPS
+    if not math.isfinite(fps):
+        return WS_TARGET_FPS
+    if fps <= 0:
+        return WS_MAX_FPS
+    return min(max(fps, WS_MIN_FPS), WS_MAX_FPS)
+
+
+class FrameScheduler:
+    """Latest-frame-wins hand-off between a websocket reader and its inference loop.
+
+    put() never blocks: a frame that has not been picked up yet is replaced
+    (and counted as dropped) by the newer one. get() hands out the newest
+    frame no sooner than the adaptive interval, which is the larger of the
+    target frame period and the measured average inference time.
+    """
+
+    def __init__(self, target_fps=WS_TARGET_FPS, smoothing=0.3):
+        self.target_interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.smoothing = smoothing
+
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.avg_inference = 0.0
+
+        self._frame = None
+        self._event = asyncio.Event()
+        self._next_due = 0.0
+        self._closed = False
+
+    @property
+    def interval(self):
+        return max(self.target_interval, self.avg_inference)
+
+    def put(self, frame):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+    async def get(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._event.wait()
+            if self._closed:
+                return None
+
+            wait = self._next_due - loop.time()
+            if wait > 0:
+                # Newer frames keep replacing the slot while we wait
+                await asyncio.sleep(wait)
+                continue
+
+            frame = self._frame
+            self._frame = None
+            self._event.clear()
+            self._next_due = loop.time() + self.interval
+            return frame
+
+    def record(self, inference_seconds):
+        self.processed += 1
+        if self.processed == 1:
+            self.avg_inference = inference_seconds
+        else:
+            self.avg_inference += self.smoothing * (inference_seconds - self.avg_inference)
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "avg_inference_ms": round(self.avg_inference * 1000, 1),
+            "interval_ms": round(self.interval * 1000, 1),
+        }
@@ -0,0 +1,322 @@
+import threading
+from collections import namedtuple
+import torch
+import torch.nn.functional as F
+
+METRICS = ("l2", "cosine")
+
+# What one search reads. Writers publish a new view with a single reference
+# swap, so a search sees rows, names and IVF lists from the same moment.
+_View = namedtuple("_View", "matrix scales names centroids lists")
+
+
+class GalleryIndex:
+    """Enrolled face embeddings held as one contiguous L2-normalized matrix.
+
+    search() answers top-k queries for a batch of probes with a single matmul.
+    With metric="l2" scores are euclidean distances (smaller is closer), with
+    metric="cosine" they are cosine similarities (larger is closer). Setting
+    n_lists > 0 partitions the gallery with spherical k-means (IVF) and only
+    the n_probe closest partitions are scanned per probe. upsert() and
+    remove() update single rows for live enrollments while other threads
+    search; search_names() also returns the names the indices refer to.
+
+    dtype may be float32, float16 or int8. int8 rows are stored symmetrically
+    quantized with one float32 scale per row (a quarter of the fp32 memory).
+
+    shared=True searches the given float32 CPU matrix in place, e.g. the
+    read-only memory map of the embedding store that every worker of a host
+    shares. Rows need not be normalized: their inverse norms are kept as row
+    scales, like the int8 scales. A shared index is rebuilt, not updated.
+    Rows named None (deleted from the store) get a zero scale, so they score
+    a similarity of 0 and never match; other indexes drop them.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        names=None,
+        metric="l2",
+        dtype=torch.float32,
+        device="cpu",
+        n_lists=0,
+        n_probe=8,
+        shared=False,
+        centroids=None,
+    ):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+        if shared and (dtype != torch.float32 or torch.device(device).type != "cpu"):
+            raise ValueError("A shared gallery must be float32 on the CPU")
+
+        self.metric = metric
+        self.dtype = dtype
+        self.device = torch.device(device)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.shared = shared
+        # Row scales are applied to the similarities
+        self.scaled = shared or dtype == torch.int8
+
+        # Backing storage with spare capacity, only touched by writers
+        self.rows = {}
+        self._buffer = torch.empty((0, 512), dtype=dtype, device=self.device)
+        self._scale_buffer = torch.empty((0,), dtype=torch.float32, device=self.device)
+        self.assignment = None
+        self._write_lock = threading.Lock()
+        self._view = _View(self._buffer, self._scale_buffer, [], None, [])
+
+        if embeddings is not None:
+            self.build(embeddings, names, centroids)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def names(self):
+        return self._view.names
+
+    @property
+    def matrix(self):
+        return self._view.matrix
+
+    @property
+    def scales(self):
+        return self._view.scales
+
+    @property
+    def centroids(self):
+        return self._view.centroids
+
+    def build(self, embeddings, names, centroids=None):
+        # centroids: IVF partitions to reuse instead of training new ones
+        if embeddings.ndim == 1:
+            embeddings = embeddings.unsqueeze(0)
+        if len(names) != embeddings.shape[0]:
+            raise ValueError(f"Got {embeddings.shape[0]} embeddings for {len(names)} names")
+
+        names = list(names)
+        if self.shared:
+            buffer = embeddings
+            scale_buffer = 1 / torch.linalg.vector_norm(embeddings, dim=1).clamp(min=1e-12)
+            dead = [row for row, name in enumerate(names) if name is None]
+            if dead:
+                scale_buffer[dead] = 0
+        else:
+            live = [row for row, name in enumerate(names) if name is not None]
+            if len(live) < len(names):
+                embeddings, names = embeddings[live], [names[row] for row in live]
+            buffer, scale_buffer = self._encode(
+                F.normalize(embeddings.to(torch.float32), p=2, dim=1).to(self.device)
+            )
+
+        assignment = None
+        if self.n_lists > 0 and len(names) > self.n_lists:
+            data = self._decode(buffer, scale_buffer)
+            if centroids is not None and len(centroids) == self.n_lists:
+                centroids = centroids.to(self.device)
+            else:
+                centroids = self._train_ivf(data)
+            assignment = torch.argmax(data @ centroids.T, dim=1)
+        else:
+            centroids = None
+
+        with self._write_lock:
+            self.rows = {name: row for row, name in enumerate(names) if name is not None}
+            self._buffer, self._scale_buffer = buffer, scale_buffer
+            self.assignment = assignment
+            lists = self._lists(len(names)) if centroids is not None else []
+            self._view = _View(buffer, scale_buffer, names, centroids, lists)
+
+    def _encode(self, vectors):
+        # Unit float32 rows -> stored rows and per-row scales (int8 only)
+        if self.dtype != torch.int8:
+            return vectors.to(self.dtype).contiguous(), torch.ones(len(vectors), device=self.device)
+        scales = vectors.abs().amax(dim=1).clamp(min=1e-12) / 127
+        rows = torch.round(vectors / scales[:, None]).to(torch.int8)
+        return rows.contiguous(), scales
+
+    def _decode(self, matrix, scales):
+        if self.scaled:
+            return matrix.float() * scales[:, None]
+        return matrix.float()
+
+    def _similarities(self, probes, matrix, scales, chunk_size=16384):
+        if matrix.dtype == torch.float32 or (matrix.is_cuda and matrix.dtype != torch.int8):
+            sims = probes.to(matrix.dtype) @ matrix.T
+        else:
+            # Reduced precision matmul is slow or missing on CPU: upcast in chunks
+            sims = torch.cat(
+                [probes @ matrix[i:i + chunk_size].float().T for i in range(0, len(matrix), chunk_size)],
+                dim=1,
+            )
+        # Row scales are applied to the (probes x rows) result, not the rows
+        if self.scaled:
+            sims *= scales
+        return sims
+
+    def _to_scores(self, sims):
+        sims = sims.float()
+        if self.metric == "cosine":
+            return sims
+        # |a - b|^2 = 2 - 2 cos(a, b) for unit vectors
+        return torch.sqrt(torch.clamp(2 - 2 * sims, min=0))
+
+    def _train_ivf(self, data, iterations=10):
+        generator = torch.Generator().manual_seed(0)
+        init = torch.randperm(len(data), generator=generator)[: self.n_lists].to(data.device)
+        centroids = data[init].clone()
+
+        for _ in range(iterations):
+            assignment = torch.argmax(data @ centroids.T, dim=1)
+            sums = torch.zeros_like(centroids).index_add_(0, assignment, data)
+            counts = torch.bincount(assignment, minlength=self.n_lists)
+            # Keep the previous centroid for partitions that went empty
+            empty = counts == 0
+            sums[empty] = centroids[empty]
+            centroids = F.normalize(sums, p=2, dim=1)
+        return centroids
+
+    def _lists(self, count):
+        # Row ids per partition for the first count rows; caller holds the lock
+        assignment = self.assignment[:count]
+        return [torch.nonzero(assignment == i).flatten() for i in range(self.n_lists)]
+
+    def upsert(self, name, embedding):
+        if self.shared:
+            raise RuntimeError("A shared gallery is read-only, update the embedding store and rebuild it")
+        unit = F.normalize(embedding.reshape(1, -1).to(torch.float32), p=2, dim=1).to(self.device)
+        stored, scale = self._encode(unit)
+        vector, scale = stored[0], scale[0]
+
+        with self._write_lock:
+            view = self._view
+            row = self.rows.get(name)
+            if row is not None:
+                # Same name, same row: a search racing this write may score
+                # a half-updated vector but still reports the right name
+                self._buffer[row] = vector
+                self._scale_buffer[row] = scale
+                names = view.names
+            else:
+                row = len(view.names)
+                if row == len(self._buffer):
+                    # Amortised O(1) appends: grow the backing buffer by doubling
+                    grown = torch.empty(
+                        (max(16, 2 * len(self._buffer)), self._buffer.shape[1]),
+                        dtype=self.dtype,
+                        device=self.device,
+                    )
+                    grown[:row] = self._buffer[:row]
+                    self._buffer = grown
+                    grown_scales = self._scale_buffer.new_empty(len(grown))
+                    grown_scales[:row] = self._scale_buffer[:row]
+                    self._scale_buffer = grown_scales
+                # Rows past the published view are not read by any search
+                self._buffer[row] = vector
+                self._scale_buffer[row] = scale
+                names = view.names + [name]
+                self.rows[name] = row
+
+            lists = view.lists
+            if view.centroids is not None:
+                if len(self.assignment) <= row:
+                    self.assignment = torch.cat([self.assignment, self.assignment.new_zeros(len(self._buffer))])
+                self.assignment[row] = torch.argmax(view.centroids @ unit[0])
+                # Rebuilt by the next search, once per burst of writes
+                lists = None
+
+            count = len(names)
+            self._view = _View(self._buffer[:count], self._scale_buffer[:count], names, view.centroids, lists)
+
+    def remove(self, name):
+        if self.shared:
+            raise RuntimeError("A shared gallery is read-only, update the embedding store and rebuild it")
+        with self._write_lock:
+            row = self.rows.pop(name, None)
+            if row is None:
+                return False
+
+            # Swap-remove, mirroring the embedding store layout, on a copy:
+            # searches still running on the old view keep the rows their
+            # names refer to, and the freed row can be reused right away
+            view = self._view
+            names = list(view.names)
+            last = len(names) - 1
+            self._buffer = self._buffer.clone()
+            self._scale_buffer = self._scale_buffer.clone()
+            if row != last:
+                self._buffer[row] = self._buffer[last]
+                self._scale_buffer[row] = self._scale_buffer[last]
+                names[row] = names[last]
+                self.rows[names[row]] = row
+                if view.centroids is not None:
+                    self.assignment[row] = self.assignment[last]
+            names.pop()
+
+            lists = None if view.centroids is not None else view.lists
+            self._view = _View(self._buffer[:last], self._scale_buffer[:last], names, view.centroids, lists)
+            return True
+
+    def _current_view(self):
+        view = self._view
+        if view.centroids is not None and view.lists is None:
+            with self._write_lock:
+                view = self._view
+                if view.lists is None:
+                    view = view._replace(lists=self._lists(len(view.names)))
+                    self._view = view
+        return view
+
+    def search(self, probes, k=1):
+        scores, indices, _ = self.search_names(probes, k)
+        return scores, indices
+
+    def search_names(self, probes, k=1):
+        # Like search(), plus the names list the returned indices index into
+        if probes.ndim == 1:
+            probes = probes.unsqueeze(0)
+
+        view = self._current_view()
+        k = min(k, len(view.matrix))
+        if k == 0:
+            raise ValueError("Gallery is empty")
+
+        probes = F.normalize(probes.to(torch.float32), p=2, dim=1).to(self.device)
+
+        if view.centroids is not None:
+            scores, indices = self._search_ivf(probes, k, view)
+        else:
+            top = torch.topk(self._similarities(probes, view.matrix, view.scales), k, dim=1)
+            scores, indices = self._to_scores(top.values), top.indices
+        return scores, indices, view.names
+
+    def _search_ivf(self, probes, k, view):
+        n_probe = min(self.n_probe, self.n_lists)
+        nearest_lists = torch.topk(probes @ view.centroids.T, n_probe, dim=1).indices
+
+        all_scores, all_indices = [], []
+        for probe, list_ids in zip(probes, nearest_lists.tolist()):
+            candidates = torch.cat([view.lists[i] for i in list_ids])
+            if len(candidates) < k:
+                candidates = torch.arange(len(view.matrix), device=self.device)
+
+            sims = self._similarities(probe.unsqueeze(0), view.matrix[candidates], view.scales[candidates])
+            top = torch.topk(sims, k, dim=1)
+            all_scores.append(self._to_scores(top.values))
+            all_indices.append(candidates[top.indices])
+
+        return torch.cat(all_scores), torch.cat(all_indices)
+
+    def matches(self, scores, l2_threshold):
+        # Thresholds across the code base are expressed as L2 distances
+        if self.metric == "cosine":
+            return scores >= 1 - l2_threshold ** 2 / 2
+        return scores < l2_threshold
+
+    def distances(self, scores):
+        # Scores of either metric as L2 distances between unit embeddings,
+        # the scale of the thresholds and of the "distance" in replies
+        if self.metric == "cosine":
+            return torch.sqrt(torch.clamp(2 - 2 * scores, min=0))
+        return scores
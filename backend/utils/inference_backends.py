@@ -0,0 +1,184 @@
+import copy
+import inspect
+import os
+import threading
+import time
+from pathlib import Path
+import torch
+from utils.model_registry import MODELS_DIR, artifact_lock, device, get_resnet, inference_context, publish_file
+
+# Runtime for the face networks, chosen per deployment:
+#   EMBEDDING_BACKEND  eager | torchscript | compile | onnx |
+#                      int8-static                          (InceptionResnetV1)
+#   DETECTOR_BACKEND   eager | torchscript                    (MTCNN P/R/O-Nets)
+# A non-eager embedding backend is checked against the eager model on load
+# and the worker falls back to eager if the outputs drift. int8 backends are
+# lossy by design and get the looser QUANTIZED_PARITY_TOL (see utils.quantization).
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "eager")
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "eager")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+EMBEDDING_PARITY_TOL = float(os.getenv("EMBEDDING_PARITY_TOL", "1e-3"))
+QUANTIZED_PARITY_TOL = float(os.getenv("QUANTIZED_PARITY_TOL", "0.05"))
+
+ONNX_MODEL_PATH = MODELS_DIR / "inception_resnet_v1.onnx"
+INT8_MODEL_PATH = MODELS_DIR / "inception_resnet_v1_int8.pt"
+
+FACE_SHAPE = (3, 160, 160)
+
+
+class EagerBackend:
+    name = "eager"
+    parity_tol = EMBEDDING_PARITY_TOL
+
+    def __init__(self, model, device=device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, faces):
+        # faces: (N, 3, 160, 160) standardized crops -> (N, 512) embeddings
+        with inference_context():
+            return self.model(faces.to(self.device)).detach()
+
+
+class TorchScriptBackend(EagerBackend):
+    name = "torchscript"
+
+    def __init__(self, model):
+        example = torch.zeros((2, *FACE_SHAPE), device=device)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        super().__init__(torch.jit.optimize_for_inference(torch.jit.freeze(traced)))
+
+
+class CompiledBackend(EagerBackend):
+    name = "compile"
+
+    def __init__(self, model):
+        super().__init__(torch.compile(model, dynamic=True))
+
+
+class OnnxBackend:
+    name = "onnx"
+    parity_tol = EMBEDDING_PARITY_TOL
+
+    def __init__(self, model, path=ONNX_MODEL_PATH):
+        import onnxruntime as ort
+
+        if not Path(path).exists():
+            with artifact_lock(path):
+                # Another worker may have exported it while this one waited
+                if not Path(path).exists():
+                    export_onnx(model, path)
+
+        options = ort.SessionOptions()
+        if ONNX_THREADS > 0:
+            options.intra_op_num_threads = ONNX_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, faces):
+        inputs = faces.detach().to("cpu", torch.float32).contiguous().numpy()
+        return torch.from_numpy(self.session.run(None, {self.input_name: inputs})[0])
+
+
+class StaticInt8Backend(EagerBackend):
+    name = "int8-static"
+    parity_tol = QUANTIZED_PARITY_TOL
+
+    def __init__(self, model):
+        from utils.quantization import load_static
+        super().__init__(load_static(model), "cpu")
+
+
+BACKENDS = {
+    "eager": EagerBackend,
+    "torchscript": TorchScriptBackend,
+    "compile": CompiledBackend,
+    "onnx": OnnxBackend,
+    "int8-static": StaticInt8Backend,
+}
+
+
+def export_onnx(model, path=ONNX_MODEL_PATH):
+    # Newer torch defaults to the dynamo exporter; keep the TorchScript one
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    publish_file(path, lambda tmp_path: torch.onnx.export(
+        copy.deepcopy(model).cpu(),
+        torch.zeros((2, *FACE_SHAPE)),
+        str(tmp_path),
+        input_names=["faces"],
+        output_names=["embeddings"],
+        dynamic_axes={"faces": {0: "batch"}, "embeddings": {0: "batch"}},
+        opset_version=17,
+        **options,
+    ))
+    print(f"Exported embedding model to {path}")
+
+
+def parity(backend, reference, batch_size=4, seed=0):
+    # Max absolute difference to the reference backend on random crops, drawn
+    # from the [-1, 1) range of fixed_image_standardization
+    generator = torch.Generator().manual_seed(seed)
+    faces = torch.rand((batch_size, *FACE_SHAPE), generator=generator) * 2 - 1
+    expected = reference(faces).float().cpu()
+    actual = backend(faces).float().cpu()
+    return (expected - actual).abs().max().item()
+
+
+def build_embedder(name=EMBEDDING_BACKEND):
+    eager = EagerBackend(get_resnet())
+    if name == "eager":
+        return eager
+    if name not in BACKENDS:
+        print(f"Unknown embedding backend '{name}', using eager")
+        return eager
+
+    try:
+        start = time.perf_counter()
+        backend = BACKENDS[name](get_resnet())
+        diff = parity(backend, eager)
+    except Exception as e:
+        print(f"Embedding backend '{name}' unavailable ({e}), using eager")
+        return eager
+
+    if diff > backend.parity_tol:
+        print(f"Embedding backend '{name}' differs from eager by {diff:.2e}, using eager")
+        return eager
+
+    print(f"Embedding backend '{name}' ready in {time.perf_counter() - start:.2f}s (max diff {diff:.2e})")
+    return backend
+
+
+_embedder = None
+_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                _embedder = build_embedder()
+    return _embedder
+
+
+def optimize_detector(mtcnn, name=DETECTOR_BACKEND):
+    # Swap the P/R/O-Nets for traced TorchScript modules. They keep their
+    # parameters (not frozen) because detect_face reads the dtype from them.
+    if name == "eager":
+        return mtcnn
+    if name != "torchscript":
+        print(f"Unknown detector backend '{name}', using eager")
+        return mtcnn
+
+    try:
+        with torch.no_grad():
+            mtcnn.pnet = torch.jit.trace(mtcnn.pnet.eval(), torch.zeros((1, 3, 48, 48), device=device))
+            mtcnn.rnet = torch.jit.trace(mtcnn.rnet.eval(), torch.zeros((4, 3, 24, 24), device=device))
+            mtcnn.onet = torch.jit.trace(mtcnn.onet.eval(), torch.zeros((4, 3, 48, 48), device=device))
+        print("Detector backend 'torchscript' ready")
+    except Exception as e:
+        print(f"Detector backend 'torchscript' unavailable ({e}), using eager")
+    return mtcnn
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from controllers.students_pred import (
+    predict_batch,
+    detect_frames,
+    identify_faces,
+    low_confidence,
+    MATCH_MESSAGE,
+)
+from utils import frame_gate
+
+# All websocket frames go through one inference service per worker process.
+# Requests arriving within a short window are folded into one micro-batch so
+# several cameras share a single MTCNN/ResNet pass instead of each running
+# batch-1 forward passes that fight over the same cores.
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "15"))
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+
+class MicroBatcher:
+    """Collects single requests into batches for a list-in/list-out function.
+
+    batch_fn runs on the inference executor and must return one result per
+    item. Each of the `workers` collector tasks takes the first waiting item,
+    keeps collecting for up to `window_ms` (or until `max_batch` items) and
+    then runs the batch, so while one batch is busy the next one fills up.
+    """
+
+    def __init__(self, name, batch_fn, workers=INFERENCE_WORKERS,
+                 window_ms=INFERENCE_BATCH_WINDOW_MS, max_batch=INFERENCE_MAX_BATCH):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.workers = workers
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+
+        self.requests = 0
+        self.processed = 0
+        self.batches = 0
+        self.in_flight = 0
+        self.largest_batch = 0
+        self.total_batch_seconds = 0.0
+        self.total_wait_seconds = 0.0
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queue and collectors belong to one event loop (a new one in tests)
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._tasks = []
+        if not self._tasks:
+            for _ in range(self.workers):
+                self._tasks.append(asyncio.create_task(self._collect()))
+
+    async def submit(self, item):
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Callers that went away (closed websocket) are not worth computing
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self.in_flight += 1
+            try:
+                results = await loop.run_in_executor(_executor, self.batch_fn, [item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                print(f"Inference batch '{self.name}' failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+
+            self.batches += 1
+            self.processed += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.total_batch_seconds += time.perf_counter() - started
+            self.total_wait_seconds += sum(started - queued_at for _, _, queued_at in batch)
+
+    def stats(self):
+        processed = self.processed
+        return {
+            "queue_depth": self.queue_depth(),
+            "in_flight_batches": self.in_flight,
+            "requests": self.requests,
+            "processed": processed,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": round(processed / self.batches, 2) if self.batches else 0,
+            "avg_batch_ms": round(self.total_batch_seconds / self.batches * 1000, 1) if self.batches else 0,
+            "avg_queue_wait_ms": round(self.total_wait_seconds / processed * 1000, 1) if processed else 0,
+        }
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+_predict = MicroBatcher("predict", predict_batch)
+_detect = MicroBatcher("detect", detect_frames)
+_identify = MicroBatcher("identify", identify_faces)
+_batchers = (_predict, _detect, _identify)
+
+
+async def predict(image, multi_face=False, profile=None, roi=None):
+    # Same results as predict_image / predict_faces, but batched with other callers
+    return await _predict.submit((image, multi_face, profile, roi))
+
+
+async def predict_tracked(tracker, image, multi_face=False, profile=None, roi=None):
+    # predict() for a stream of frames: detection runs every frame, but only
+    # faces whose track needs (re)recognition are embedded and matched.
+    try:
+        image, boxes, probs, rejection = await _detect.submit((image, profile, roi))
+        if rejection is not None:
+            return [rejection] if multi_face else rejection
+
+        # Single-face mode only looks at the largest face
+        if not multi_face:
+            boxes, probs = boxes[:1], probs[:1]
+
+        results = [low_confidence(box, confidence) for box, confidence in zip(boxes, probs)]
+        confident = [j for j, result in enumerate(results) if result is None]
+        tracks = tracker.update([boxes[j] for j in confident])
+
+        pending = [(j, track) for j, track in zip(confident, tracks) if tracker.needs_recognition(track)]
+        identities = await asyncio.gather(*(_identify.submit((image, track.box)) for _, track in pending))
+        for (_, track), identity in zip(pending, identities):
+            tracker.assign(track, identity, identity[2] == MATCH_MESSAGE)
+
+        for j, track in zip(confident, tracks):
+            results[j] = (*track.identity, boxes[j].tolist())
+
+        return results if multi_face else results[0]
+    except Exception as e:
+        print(f"Error during prediction: {e}")
+        error = ("Error", 0, str(e), None)
+        return [error] if multi_face else error
+
+
+async def face_present(image, profile=None):
+    # Presence check for gated connections, off the event loop but not batched.
+    # The profile's min face size and pyramid factor apply here too.
+    mtcnn = profile.mtcnn() if profile is not None else None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, lambda: frame_gate.face_present(image, mtcnn=mtcnn)
+    )
+
+
+def get_metrics():
+    return {
+        "workers": INFERENCE_WORKERS,
+        "batch_window_ms": INFERENCE_BATCH_WINDOW_MS,
+        "max_batch": INFERENCE_MAX_BATCH,
+        "batchers": {batcher.name: batcher.stats() for batcher in _batchers},
+        "gate": frame_gate.get_metrics(),
+    }
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# torch, facenet_pytorch, the face models and the embeddings gallery are
+# loaded here, on a background thread after the app started, instead of when
+# the routes are imported. Non-ML endpoints serve requests right away; ML
+# endpoints await load_models() first and /ready reports when it finished.
+# MODEL_WARMUP=0 skips the load at startup, the first ML request does it.
+
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1")
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+_lock = threading.Lock()
+_future = None
+_state = {"status": "not loaded", "seconds": None, "error": None}
+
+
+def _load():
+    _state.update(status="loading", error=None)
+    start = time.perf_counter()
+    try:
+        # Importing the service loads controllers.students_pred and with it
+        # the embeddings gallery
+        from utils import inference_service
+        from utils.model_registry import warmup
+
+        if MODEL_WARMUP == "1":
+            warmup()
+    except Exception as e:
+        print(f"Model loading failed: {e}")
+        _state.update(status="failed", error=str(e))
+        raise
+    _state.update(status="ready", seconds=round(time.perf_counter() - start, 2))
+
+
+def start():
+    # Starts loading once (again after a failure); returns the loading future
+    global _future
+    with _lock:
+        if _future is None or (_future.done() and _future.exception() is not None):
+            _future = _executor.submit(_load)
+        return _future
+
+
+async def load_models():
+    await asyncio.wrap_future(start())
+
+
+def is_loaded():
+    return _state["status"] == "ready"
+
+
+def status():
+    # Without warmup the worker is ready to serve before the models are loaded
+    return {"ready": is_loaded() or MODEL_WARMUP != "1", "models": dict(_state)}
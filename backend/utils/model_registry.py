@@ -0,0 +1,200 @@
+import argparse
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import torch
+from facenet_pytorch import MTCNN, InceptionResnetV1
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Single place where the face models live. Every module asks the registry for
+# MTCNN / InceptionResnetV1 so a worker process holds one copy of the weights.
+# The InceptionResnetV1 weights load from RESNET_WEIGHTS_PATH, a plain state
+# dict in torch's zip format that torch.load memory-maps, instead of the
+# pretrained checkpoint facenet_pytorch downloads and unpickles. The file is
+# written on the first load, or ahead of time (e.g. in the Docker build) with
+#   python -m utils.model_registry
+
+device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+MODELS_PATH = os.getenv("MODELS_PATH")
+if MODELS_PATH:
+    MODELS_DIR = Path(MODELS_PATH)
+else:
+    MODELS_DIR = Path(__file__).resolve().parent.parent / "face_detection_models"
+RESNET_WEIGHTS_PATH = Path(os.getenv("RESNET_WEIGHTS_PATH", MODELS_DIR / "inception_resnet_v1_vggface2.pt"))
+
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+USE_INFERENCE_MODE = os.getenv("TORCH_INFERENCE_MODE", "1") == "1"
+
+_lock = threading.RLock()
+_mtcnns = {}
+_resnet = None
+_threads_configured = False
+
+
+def configure_threads():
+    global _threads_configured
+    if _threads_configured:
+        return
+
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError as e:
+            # Only allowed before the first parallel op in the process
+            print(f"Could not set interop threads: {e}")
+
+    _threads_configured = True
+    print(f"Torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def inference_context():
+    return torch.inference_mode() if USE_INFERENCE_MODE else torch.no_grad()
+
+
+def _options_key(options):
+    return tuple(
+        sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in options.items())
+    )
+
+
+def get_mtcnn(**options):
+    # MTCNN instances are cached per option set (keep_all, thresholds, ...).
+    # Variants share the P/R/O-Net modules of the default instance.
+    key = _options_key(options)
+    mtcnn = _mtcnns.get(key)
+    if mtcnn is not None:
+        return mtcnn
+
+    with _lock:
+        if key not in _mtcnns:
+            configure_threads()
+            mtcnn = MTCNN(device=device, **options)
+            if key != ():
+                base = get_mtcnn()
+                mtcnn.pnet, mtcnn.rnet, mtcnn.onet = base.pnet, base.rnet, base.onet
+            else:
+                from utils.inference_backends import optimize_detector
+                optimize_detector(mtcnn)
+            _mtcnns[key] = mtcnn
+        return _mtcnns[key]
+
+
+@contextmanager
+def artifact_lock(path):
+    # Model files (weights, ONNX export, int8 model) are built by whichever
+    # worker of the host needs them first. Builders take this lock so the
+    # others wait and then load the finished file instead of building it too.
+    if fcntl is None:
+        yield
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def publish_file(path, write):
+    # write(tmp_path) fills a temporary file private to this call, which is
+    # then renamed over path: readers only ever see a whole file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        write(tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def save_resnet_weights(model, path=RESNET_WEIGHTS_PATH):
+    # Embedding weights only: the 8631-class VGGFace2 classifier is never used
+    state = {k: v for k, v in model.state_dict().items() if not k.startswith("logits.")}
+    publish_file(path, lambda tmp_path: torch.save(state, tmp_path))
+    print(f"Saved InceptionResnetV1 weights to {path}")
+
+
+def _load_weights(path):
+    # Parameters are created on the meta device (no random init) and then
+    # take over the memory-mapped tensors of the file
+    state = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    with torch.device("meta"):
+        model = InceptionResnetV1()
+    model.load_state_dict(state, assign=True)
+    return model
+
+
+def load_resnet(path=RESNET_WEIGHTS_PATH):
+    if Path(path).exists():
+        try:
+            return _load_weights(path)
+        except Exception as e:
+            print(f"Could not load InceptionResnetV1 weights from {path}, rebuilding them: {e}")
+
+    with artifact_lock(path):
+        # Another worker may have written the file while this one waited
+        if Path(path).exists():
+            try:
+                return _load_weights(path)
+            except Exception:
+                pass
+        model = InceptionResnetV1(pretrained="vggface2")
+        try:
+            save_resnet_weights(model, path)
+        except OSError as e:
+            print(f"Could not save InceptionResnetV1 weights to {path}: {e}")
+        return model
+
+
+def get_resnet():
+    global _resnet
+    if _resnet is not None:
+        return _resnet
+
+    with _lock:
+        if _resnet is None:
+            configure_threads()
+            start = time.perf_counter()
+            _resnet = load_resnet().eval().to(device)
+            print(f"InceptionResnetV1 loaded in {time.perf_counter() - start:.2f}s")
+        return _resnet
+
+
+def warmup():
+    # Eagerly load both models and run one dummy pass so the first real
+    # frame does not pay for lazy initialisation.
+    from utils.inference_backends import get_embedder
+
+    start = time.perf_counter()
+    mtcnn = get_mtcnn()
+    embedder = get_embedder()
+
+    with inference_context():
+        mtcnn.detect(torch.zeros((160, 160, 3), dtype=torch.uint8))
+    embedder(torch.zeros((1, 3, 160, 160), device=device))
+
+    print(f"Model warmup finished in {time.perf_counter() - start:.2f}s on {device}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the InceptionResnetV1 weights file loaded at startup")
+    parser.add_argument("--path", default=str(RESNET_WEIGHTS_PATH))
+    args = parser.parse_args()
+    save_resnet_weights(InceptionResnetV1(pretrained="vggface2"), args.path)
@@ -0,0 +1,203 @@
+import argparse
+import copy
+import os
+import random
+import time
+from itertools import zip_longest
+from pathlib import Path
+import torch
+import torch.nn.functional as F
+from utils.inference_backends import INT8_MODEL_PATH
+from utils.model_registry import artifact_lock, publish_file
+
+# int8 InceptionResnetV1 for CPU workers (EMBEDDING_BACKEND=int8-static): FX
+# post-training quantization of the whole network, convolutions included,
+# calibrated on crops of enrolled faces and cached as TorchScript at
+# INT8_MODEL_PATH. (quantize_dynamic would only reach the single last_linear
+# layer of this network: int8 rounding error for no speedup.)
+# Recalibrate after the enrolled population changed a lot, and measure what
+# int8 embeddings / galleries cost against fp32 on a held-out image folder:
+#   python -m utils.quantization calibrate
+#   python -m utils.quantization evaluate path/to/heldout
+
+IMAGES_PATH = os.getenv("IMAGES_PATH", "./images")
+QUANT_ENGINE = os.getenv("QUANT_ENGINE", "x86")
+QUANT_CALIBRATION_IMAGES = int(os.getenv("QUANT_CALIBRATION_IMAGES", "256"))
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def _set_engine():
+    if QUANT_ENGINE in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = QUANT_ENGINE
+
+
+def labelled_images(root):
+    # root/<enrollment_number>/<image> -> [(path, enrollment_number), ...]
+    items = []
+    for folder in sorted(Path(root).iterdir()):
+        if folder.is_dir():
+            items.extend(
+                (path, folder.name)
+                for path in sorted(folder.iterdir())
+                if path.suffix.lower() in IMAGE_SUFFIXES
+            )
+    return items
+
+
+def calibration_paths(root=IMAGES_PATH, limit=QUANT_CALIBRATION_IMAGES, seed=0):
+    # Spread the budget over students instead of taking the first folders
+    by_student = {}
+    for path, label in labelled_images(root):
+        by_student.setdefault(label, []).append(path)
+
+    rng = random.Random(seed)
+    for paths in by_student.values():
+        rng.shuffle(paths)
+
+    paths = []
+    for round_paths in zip_longest(*by_student.values()):
+        paths.extend(path for path in round_paths if path is not None)
+    return paths[:limit]
+
+
+def face_crops(paths):
+    # Standardized 3x160x160 crops for the paths with a usable face
+    from utils.embedding_pipeline import iter_face_crops
+
+    indices, crops = [], []
+    for _, batch in iter_face_crops(paths):
+        for index, crop in batch:
+            indices.append(index)
+            crops.append(crop)
+    if not crops:
+        return indices, torch.empty((0, 3, 160, 160))
+    return indices, torch.stack(crops)
+
+
+def quantize_static(model, crops, batch_size=16):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    _set_engine()
+    example = crops[:2]
+    prepared = prepare_fx(
+        copy.deepcopy(model).cpu().eval(),
+        get_default_qconfig_mapping(torch.backends.quantized.engine),
+        (example,),
+    )
+    with torch.no_grad():
+        for i in range(0, len(crops), batch_size):
+            prepared(crops[i:i + batch_size])
+        quantized = convert_fx(prepared)
+        return torch.jit.freeze(torch.jit.trace(quantized, example))
+
+
+def calibrate(model, root=IMAGES_PATH, path=INT8_MODEL_PATH, limit=QUANT_CALIBRATION_IMAGES):
+    start = time.perf_counter()
+    _, crops = face_crops(calibration_paths(root, limit))
+    if len(crops) < 2:
+        raise RuntimeError(f"Need enrolled face images under {root} to calibrate int8 model")
+
+    quantized = quantize_static(model, crops)
+    publish_file(path, lambda tmp_path: torch.jit.save(quantized, str(tmp_path)))
+    print(f"Calibrated int8 model on {len(crops)} faces in {time.perf_counter() - start:.1f}s, saved to {path}")
+    return quantized
+
+
+def load_static(model, path=INT8_MODEL_PATH):
+    # Cached calibrated model, or calibrate now on the enrolled images. One
+    # worker of the host calibrates, the others wait and load its file.
+    if not Path(path).exists():
+        with artifact_lock(path):
+            if not Path(path).exists():
+                return calibrate(model, path=path)
+    _set_engine()
+    return torch.jit.load(str(path), map_location="cpu")
+
+
+def _embed(backend, crops, batch_size=32):
+    start = time.perf_counter()
+    embeddings = torch.cat([backend(crops[i:i + batch_size]).float().cpu() for i in range(0, len(crops), batch_size)])
+    return embeddings, (time.perf_counter() - start) * 1000 / max(len(crops), 1)
+
+
+def evaluate(heldout, backends, gallery_dtypes):
+    # Identification on labelled held-out images against the enrolled gallery,
+    # for each embedding backend x gallery dtype. Distance shifts and agreement
+    # are relative to the first row (eager / float32 by default).
+    from controllers.students_pred import MATCH_THRESHOLD, GALLERY_METRIC, GALLERY_DTYPES
+    from utils.embedding_store import get_store
+    from utils.gallery_index import GalleryIndex
+    from utils.inference_backends import BACKENDS, EagerBackend
+    from utils.model_registry import get_resnet
+
+    items = labelled_images(heldout)
+    indices, crops = face_crops([path for path, _ in items])
+    labels = [items[i][1] for i in indices]
+    if not labels:
+        raise SystemExit(f"No faces found in {heldout}")
+
+    vectors, names = get_store().snapshot()
+    live = [row for row, name in enumerate(names) if name is not None]
+    if not live:
+        raise SystemExit("The embedding store is empty, enroll students first")
+    enrolled = torch.from_numpy(vectors[live])
+    names = [names[row] for row in live]
+    expected = [label if label in names else "Unknown" for label in labels]
+    print(f"{len(labels)} held-out faces from {len(items)} images, {len(names)} enrolled students")
+
+    resnet = get_resnet()
+    reference, _ = _embed(EagerBackend(resnet), crops)
+    baseline = None
+
+    print(
+        f"{'backend':>13} {'gallery':>8} {'accuracy':>9} {'agree':>7} "
+        f"{'mean |dd|':>10} {'max |dd|':>9} {'min cos':>8} {'ms/face':>8}"
+    )
+    for name in backends:
+        backend = EagerBackend(resnet) if name == "eager" else BACKENDS[name](resnet)
+        embeddings, ms_per_face = _embed(backend, crops)
+        cosine = F.cosine_similarity(reference, embeddings).min().item()
+
+        for dtype_name in gallery_dtypes:
+            gallery = GalleryIndex(enrolled, names, metric=GALLERY_METRIC, dtype=GALLERY_DTYPES[dtype_name])
+            scores, rows = gallery.search(embeddings, k=1)
+            scores, rows = scores[:, 0], rows[:, 0]
+            matched = gallery.matches(scores, MATCH_THRESHOLD).tolist()
+            predicted = [names[row] if hit else "Unknown" for row, hit in zip(rows.tolist(), matched)]
+
+            if baseline is None:
+                baseline = (scores, predicted)
+            accuracy = sum(p == e for p, e in zip(predicted, expected)) / len(expected)
+            agree = sum(p == b for p, b in zip(predicted, baseline[1])) / len(expected)
+            shift = (scores - baseline[0]).abs()
+            print(
+                f"{name:>13} {dtype_name:>8} {accuracy:>9.4f} {agree:>7.4f} "
+                f"{shift.mean().item():>10.5f} {shift.max().item():>9.5f} {cosine:>8.5f} {ms_per_face:>8.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate and evaluate the int8 embedding model")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    calibrate_parser = commands.add_parser("calibrate", help="rebuild the static int8 model")
+    calibrate_parser.add_argument("--images", default=IMAGES_PATH, help="enrolled images, one folder per student")
+    calibrate_parser.add_argument("--limit", type=int, default=QUANT_CALIBRATION_IMAGES)
+
+    evaluate_parser = commands.add_parser("evaluate", help="compare int8 with fp32 on held-out images")
+    evaluate_parser.add_argument("heldout", help="held-out images, one folder per enrollment number")
+    evaluate_parser.add_argument("--backends", nargs="+", default=["eager", "int8-static"])
+    evaluate_parser.add_argument("--gallery-dtypes", nargs="+", default=["float32", "float16", "int8"])
+
+    args = parser.parse_args()
+    if args.command == "calibrate":
+        from utils.model_registry import get_resnet
+        calibrate(get_resnet(), args.images, limit=args.limit)
+    else:
+        evaluate(args.heldout, args.backends, args.gallery_dtypes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import functools
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from fastapi.encoders import jsonable_encoder
+
+# Cache for read-heavy GET handlers. Entries expire after a TTL and are
+# dropped early by tag when the data behind them changes (invalidate()).
+# The store is pluggable: anything implementing CacheBackend (e.g. a Redis
+# client wrapper) can be installed with set_backend(). The in-process
+# backend is per worker, so other workers only see a change after the TTL.
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key):
+        # Returns the value, or None when missing or expired
+        ...
+
+    @abstractmethod
+    def set(self, key, value, ttl, tags=()):
+        ...
+
+    @abstractmethod
+    def invalidate(self, tag):
+        # Drops every entry stored with the tag, returns how many
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def __len__(self):
+        ...
+
+
+class MemoryBackend(CacheBackend):
+    """LRU-bounded dict of (expires_at, value) with a tag -> keys index."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, tag):
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_backend = MemoryBackend()
+_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def set_backend(backend: CacheBackend):
+    global _backend
+    _backend = backend
+
+
+def invalidate(*tags):
+    for tag in tags:
+        _counters["invalidations"] += _backend.invalidate(tag)
+
+
+def cached(*tags, ttl=None):
+    """Cache a GET handler's JSON-ready result.
+
+    The key is the handler name plus its arguments (minus injected sessions
+    and requests); tags may use the arguments, e.g. "student_images:{id}".
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(**kwargs):
+            params = {name: value for name, value in kwargs.items() if name not in ("session", "request", "response")}
+            key = fn.__name__ + repr(sorted(params.items()))
+            value = _backend.get(key)
+            if value is not None:
+                _counters["hits"] += 1
+                return value
+
+            _counters["misses"] += 1
+            value = jsonable_encoder(await fn(**kwargs))
+            _backend.set(
+                key,
+                value,
+                RESPONSE_CACHE_TTL if ttl is None else ttl,
+                [tag.format(**params) for tag in tags],
+            )
+            return value
+        return wrapper
+    return decorator
+
+
+def get_metrics():
+    lookups = _counters["hits"] + _counters["misses"]
+    return {
+        **_counters,
+        "hit_rate": round(_counters["hits"] / lookups, 4) if lookups else 0,
+        "entries": len(_backend),
+        "evictions": getattr(_backend, "evictions", None),
+        "backend": type(_backend).__name__,
+    }
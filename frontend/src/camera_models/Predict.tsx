@@ -22,6 +22,16 @@ interface LogEntry {
   timestamp: number;
 }
 
+interface FaceReply {
+  enrollment_number?: string;
+  distance?: number;
+  message?: string;
+  attendance?: string;
+  student_name?: string;
+  box?: number[] | null;
+  error?: string;
+}
+
 interface PresentStudent {
   student_name: string;
   enrollment_number: string;
@@ -71,7 +81,8 @@ export default function Predict_face() {
           wsUrl = import.meta.env.VITE_BACKEND_URL.replace(/^http/, 'ws');
       }
 
-    ws.current = new WebSocket(wsUrl + "/api/students/ws/face_recognition");
+    // Frames go up as binary JPEG, replies come back as JSON
+    ws.current = new WebSocket(wsUrl + "/api/students/ws/face_recognition?reply=json");
     // ws.current = new WebSocket(
     //   "ws://10.20.72.7:8000/api/students/ws/face_recognition"
     // );
@@ -83,7 +94,7 @@ export default function Predict_face() {
     };
 
     ws.current.onmessage = (event: MessageEvent) => {
-      const message = event.data;
+      const message: FaceReply = JSON.parse(event.data);
       // console.log("WS Message:", message);
       handleServerResponse(message);
     };
@@ -103,26 +114,18 @@ export default function Predict_face() {
     };
   };
 
-  const handleServerResponse = (message: string) => {
-    const parts = message.split(",");
-    
-    if (parts.length >= 3) {
-        const enrollment = parts[0];
-        // const distance = parts[1];
-        const msg = parts[2];
-        const attendanceMsg = parts.length > 3 ? parts[3] : "";
-        const studentName = parts.length > 4 ? parts[4] : "";
+  const handleServerResponse = (message: FaceReply) => {
+    if (message.enrollment_number !== undefined) {
+        const enrollment = message.enrollment_number;
+        const msg = message.message || "";
+        const attendanceMsg = message.attendance || "";
+        const studentName = message.student_name || "";
         
         // Bounding box parsing
         let box = null;
-        if (parts.length >= 9) { // enrollment, dist, msg, attMsg, name, x1, y1, x2, y2
-             const x1 = parseFloat(parts[5]);
-             const y1 = parseFloat(parts[6]);
-             const x2 = parseFloat(parts[7]);
-             const y2 = parseFloat(parts[8]);
-             if (!isNaN(x1)) {
-                 box = { x1, y1, x2, y2 };
-             }
+        if (message.box && message.box.length === 4) {
+             const [x1, y1, x2, y2] = message.box;
+             box = { x1, y1, x2, y2 };
         }
         
         drawBox(box);
@@ -165,7 +168,7 @@ export default function Predict_face() {
         
         setResult({ text: displayText, type });
     } else {
-        setResult({ text: message, type: "neutral" });
+        setResult({ text: message.error || "Unexpected server reply", type: "neutral" });
     }
   };
 
@@ -258,10 +261,16 @@ export default function Predict_face() {
           // Draw video frame to canvas
           context.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-          // Convert to Base64 (JPEG, 0.5 quality for speed)
-          const base64Image = canvas.toDataURL("image/jpeg", 0.5);
-
-          ws.current.send(base64Image);
+          // Send raw JPEG bytes (0.5 quality for speed), no base64 overhead
+          canvas.toBlob(
+            (blob) => {
+              if (blob && ws.current && ws.current.readyState === WebSocket.OPEN) {
+                ws.current.send(blob);
+              }
+            },
+            "image/jpeg",
+            0.5
+          );
         }
       }
     }, 200);